@@ -640,6 +640,202 @@ public class JavaParserServer {
         return paths;
     }
 
+    // ====================== 有界路径枚举 ======================
+    private static final String STATS_SEPARATOR = "\u0001";
+    // 路径之间的分隔符，Python 端拆开后用 str(list) 格式化，与原来 str(JavaList) 的输出一致
+    private static final String PATH_SEPARATOR = "\u0002";
+
+    /**
+     * 有界枚举的统计：CFG 节点数、压缩后节点数、输出路径数、展开次数、按指纹去重剪掉的分支数，
+     * truncated 为 none / paths（达到路径预算）/ time（达到时间预算）。
+     */
+    static class PathStats {
+        int cfgNodes;
+        int compactedNodes;
+        int paths;
+        int explored;
+        int deduplicated;
+        String truncated = "none";
+
+        @Override
+        public String toString() {
+            return "cfg_nodes=" + cfgNodes + " compacted_nodes=" + compactedNodes + " paths=" + paths
+                    + " explored=" + explored + " deduplicated=" + deduplicated + " truncated=" + truncated;
+        }
+    }
+
+    private static boolean isEffectLabel(String label) {
+        return label.startsWith("LOG:") || label.startsWith("CALL:") || label.startsWith("NEW:");
+    }
+
+    // ====================== 日志投影 ======================
+    private static final String[] GUARD_PREFIXES = {
+        "IF_TRUE:", "IF_FALSE:", "FOR_COND:", "WHILE_COND:", "DO_COND:", "CASE", "FOREACH", "EXCEPTION"
+    };
+
+    /**
+     * 日志投影模式下保留的效果：日志调用、抛出/捕获异常，以及调用链上会传播日志的被调方法（按方法名匹配）。
+     */
+    private static boolean isLogEffectLabel(String label, Set<String> logCallees) {
+        if (label.startsWith("LOG:") || label.startsWith("THROW:") || label.startsWith("CATCH:")) return true;
+        if (!label.startsWith("CALL:")) return false;
+        String callee = label.substring("CALL:".length()).trim();
+        return logCallees.contains(callee.substring(callee.lastIndexOf('.') + 1));
+    }
+
+    private static boolean isGuardLabel(String label) {
+        for (String prefix : GUARD_PREFIXES) {
+            if (label.startsWith(prefix)) return true;
+        }
+        return false;
+    }
+
+    /**
+     * 把一条完整路径投影为只与日志相关的部分：ENTRY/EXIT、日志效果，以及位于某个日志效果之前的分支条件。
+     */
+    private static String projectPath(List<CFGNode> nodes, Set<String> logCallees) {
+        LinkedList<String> kept = new LinkedList<>();
+        boolean guarding = false;
+        for (int i = nodes.size() - 1; i >= 0; i--) {
+            String label = nodes.get(i).toString();
+            if (isLogEffectLabel(label, logCallees)) {
+                kept.addFirst(label);
+                guarding = true;
+            } else if ((guarding && isGuardLabel(label)) || "ENTRY".equals(label) || "EXIT".equals(label)) {
+                kept.addFirst(label);
+            }
+        }
+        return String.join(" -> ", kept);
+    }
+
+    /**
+     * 压缩 CFG：NEXT 占位节点不产生标签，直接把它们的后继接到前驱上，并去掉重复边。
+     */
+    private Map<CFGNode, List<CFGNode>> compactCFG(CFGNode entry, PathStats stats) {
+        Map<CFGNode, List<CFGNode>> graph = new LinkedHashMap<>();
+        Set<CFGNode> seen = new HashSet<>();
+        Deque<CFGNode> work = new ArrayDeque<>();
+        work.push(entry);
+        seen.add(entry);
+        while (!work.isEmpty()) {
+            CFGNode node = work.pop();
+            stats.cfgNodes++;
+            for (CFGNode successor : node.successors) {
+                if (seen.add(successor)) {
+                    work.push(successor);
+                }
+            }
+            if (node.label.equals("NEXT")) continue;
+            Set<CFGNode> targets = new LinkedHashSet<>();
+            collectNonNext(node.successors, targets, new HashSet<>());
+            graph.put(node, new ArrayList<>(targets));
+        }
+        stats.compactedNodes = graph.size();
+        return graph;
+    }
+
+    private void collectNonNext(List<CFGNode> successors, Set<CFGNode> targets, Set<CFGNode> skipped) {
+        for (CFGNode successor : successors) {
+            if (!successor.label.equals("NEXT")) {
+                targets.add(successor);
+            } else if (skipped.add(successor)) {
+                collectNonNext(successor.successors, targets, skipped);
+            }
+        }
+    }
+
+    /**
+     * 有界、去重的路径枚举：
+     * 指纹为路径上 LOG/CALL/NEW 标签的序列，两条部分路径以相同指纹到达同一节点时后续结果相同，只展开第一条（之后以更浅的深度到达时再展开一次），
+     * 因此没有日志/调用的分支（如连续的 if）不再指数级展开，每个不同的指纹只输出第一条完整路径（保留条件标签）。
+     * 超出 maxPaths 条路径或 timeBudgetMs 毫秒后停止（<= 0 表示不限制），stats 记录截断原因。
+     */
+    public List<String> extractPathsBounded(CFGNode entry, int maxPaths, int timeBudgetMs, PathStats stats) {
+        return extractPathsBounded(entry, maxPaths, timeBudgetMs, stats, null);
+    }
+
+    /**
+     * logCallees 不为 null 时为日志投影模式：指纹只由 isLogEffectLabel 的标签组成，输出 projectPath 投影后的路径，
+     * 与日志无关的分支不再产生新路径，路径文本只剩日志、异常、传播日志的调用和守护它们的条件。
+     */
+    public List<String> extractPathsBounded(CFGNode entry, int maxPaths, int timeBudgetMs, PathStats stats,
+                                            Set<String> logCallees) {
+        Map<CFGNode, List<CFGNode>> graph = compactCFG(entry, stats);
+        List<String> paths = new ArrayList<>();
+        int pathLimit = maxPaths > 0 ? maxPaths : Integer.MAX_VALUE;
+        long deadline = timeBudgetMs > 0 ? System.nanoTime() + timeBudgetMs * 1_000_000L : Long.MAX_VALUE;
+        boundedPaths(entry, graph, "", "", new LinkedHashSet<>(), 0, new HashMap<>(), paths, stats, pathLimit, deadline,
+                logCallees);
+        stats.paths = paths.size();
+        return paths;
+    }
+
+    private void boundedPaths(CFGNode node, Map<CFGNode, List<CFGNode>> graph, String path, String fingerprint,
+                              LinkedHashSet<CFGNode> onPath, int depth, Map<CFGNode, Map<String, Integer>> seen,
+                              List<String> paths, PathStats stats, int maxPaths, long deadline,
+                              Set<String> logCallees) {
+        if (!"none".equals(stats.truncated)) return;
+        if (depth > MAX_PATH_DEPTH || onPath.contains(node)) return;
+        stats.explored++;
+        if ((stats.explored & 255) == 0 && System.nanoTime() > deadline) {
+            stats.truncated = "time";
+            return;
+        }
+        String label = node.toString();
+        String newPath = logCallees != null ? path : path.isEmpty() ? label : path + " -> " + label;
+        boolean effect = logCallees != null ? isLogEffectLabel(label, logCallees) : isEffectLabel(label);
+        String newFingerprint = effect ? fingerprint + label + "\n" : fingerprint;
+        // 记录每个 (节点, 指纹) 到达时的最小深度：更浅的到达离 MAX_PATH_DEPTH 更远，后续可能走得更深，需要重新展开
+        Map<String, Integer> depths = seen.computeIfAbsent(node, k -> new HashMap<>());
+        Integer seenDepth = depths.get(newFingerprint);
+        // EXIT 没有后续，同一指纹只输出一次
+        if (seenDepth != null && (seenDepth <= depth || "EXIT".equals(node.label))) {
+            stats.deduplicated++;
+            return;
+        }
+        depths.put(newFingerprint, depth);
+        if ("EXIT".equals(node.label)) {
+            if (logCallees != null) {
+                // onPath 按插入顺序保存了当前路径
+                List<CFGNode> nodes = new ArrayList<>(onPath);
+                nodes.add(node);
+                newPath = projectPath(nodes, logCallees);
+            }
+            paths.add(newPath);
+            if (paths.size() >= maxPaths) stats.truncated = "paths";
+            return;
+        }
+        onPath.add(node);
+        for (CFGNode successor : graph.getOrDefault(node, Collections.emptyList())) {
+            boundedPaths(successor, graph, newPath, newFingerprint, onPath, depth + 1, seen,
+                    paths, stats, maxPaths, deadline, logCallees);
+        }
+        onPath.remove(node);
+    }
+
+    /**
+     * 有界版本的 analyzeControlFlowAsString：返回 以 PATH_SEPARATOR 连接的路径 + STATS_SEPARATOR + 统计信息。
+     */
+    public String analyzeControlFlowBounded(String code, int maxPaths, int timeBudgetMs) {
+        JavaParserServer builder = new JavaParserServer();
+        CFGNode cfgRoot = builder.buildCFG(code);
+        PathStats stats = new PathStats();
+        List<String> paths = builder.extractPathsBounded(cfgRoot, maxPaths, timeBudgetMs, stats);
+        return String.join(PATH_SEPARATOR, paths) + STATS_SEPARATOR + stats;
+    }
+
+    /**
+     * 日志投影版本的 analyzeControlFlowBounded，logCallees 为以换行分隔的会传播日志的被调方法名。
+     */
+    public String analyzeControlFlowLogOnly(String code, String logCallees, int maxPaths, int timeBudgetMs) {
+        JavaParserServer builder = new JavaParserServer();
+        CFGNode cfgRoot = builder.buildCFG(code);
+        PathStats stats = new PathStats();
+        Set<String> callees = new HashSet<>(Arrays.asList(logCallees.split("\n")));
+        List<String> paths = builder.extractPathsBounded(cfgRoot, maxPaths, timeBudgetMs, stats, callees);
+        return String.join(PATH_SEPARATOR, paths) + STATS_SEPARATOR + stats;
+    }
+
     /**
      * 对外接口，返回给定代码的控制流路径列表，方便 py4j 调用。
      */
@@ -648,6 +844,67 @@ public class JavaParserServer {
         return extractPaths(cfgRoot, "", new HashSet<>(), 0);
     }
 
+    /**
+     * 单次 RPC 版本：返回以 PATH_SEPARATOR 连接的路径，由 Python 端拆开后用 str(list) 格式化
+     * （List.toString() 的 [a, b] 与 str(JavaList) 的 ['a', 'b'] 不同，不能直接返回）；
+     * 每次调用使用新实例，loopHeaderStack / labeled*Map 是实例状态，py4j 的并发调用不能共享。
+     */
+    public String analyzeControlFlowAsString(String code) {
+        return String.join(PATH_SEPARATOR, new JavaParserServer().analyzeControlFlow(code));
+    }
+
+    /**
+     * 批量接口：codes 为以 '\0' 分隔的多个方法代码，一次调用返回全部结果，
+     * 结果与输入顺序一致、同样以 '\0' 分隔，每项为 analyzeControlFlowAsString 的输出，
+     * 单个方法分析失败时该项为 "ERROR: ..."，不影响其他方法。
+     */
+    public String analyzeControlFlowBatch(String codes) {
+        String[] inputs = codes.split("\0", -1);
+        String[] results = new String[inputs.length];
+        for (int i = 0; i < inputs.length; i++) {
+            try {
+                results[i] = analyzeControlFlowAsString(inputs[i]);
+            } catch (Exception e) {
+                results[i] = "ERROR: " + e.getMessage();
+            }
+        }
+        return String.join("\0", results);
+    }
+
+    /**
+     * 有界批量接口：与 analyzeControlFlowBatch 相同的 '\0' 分隔格式，每项为 analyzeControlFlowBounded 的输出。
+     */
+    public String analyzeControlFlowBatchBounded(String codes, int maxPaths, int timeBudgetMs) {
+        String[] inputs = codes.split("\0", -1);
+        String[] results = new String[inputs.length];
+        for (int i = 0; i < inputs.length; i++) {
+            try {
+                results[i] = analyzeControlFlowBounded(inputs[i], maxPaths, timeBudgetMs);
+            } catch (Exception e) {
+                results[i] = "ERROR: " + e.getMessage();
+            }
+        }
+        return String.join("\0", results);
+    }
+
+    /**
+     * 日志投影批量接口：logCallees 与 codes 一样以 '\0' 分隔、按顺序一一对应，每项为 analyzeControlFlowLogOnly 的输出。
+     */
+    public String analyzeControlFlowBatchLogOnly(String codes, String logCallees, int maxPaths, int timeBudgetMs) {
+        String[] inputs = codes.split("\0", -1);
+        String[] callees = logCallees.split("\0", -1);
+        String[] results = new String[inputs.length];
+        for (int i = 0; i < inputs.length; i++) {
+            try {
+                results[i] = analyzeControlFlowLogOnly(inputs[i], i < callees.length ? callees[i] : "",
+                        maxPaths, timeBudgetMs);
+            } catch (Exception e) {
+                results[i] = "ERROR: " + e.getMessage();
+            }
+        }
+        return String.join("\0", results);
+    }
+
     public static void main(String[] args) {
         GatewayServer server = new GatewayServer(new JavaParserServer());
         server.start();
@@ -7,8 +7,80 @@ import com.github.javaparser.ast.visitor.VoidVisitorAdapter;
 import com.github.javaparser.ast.body.ConstructorDeclaration;
 import py4j.GatewayServer;
 
+import java.io.File;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Paths;
+import java.util.Arrays;
+import java.util.LinkedHashMap;
+import java.util.Map;
+
 public class MethodExtractorGateway {
     public static class MethodExtractor {
+        private static final int CU_CACHE_SIZE = 256;
+
+        // 已解析文件的 LRU 缓存，key 为 路径 + 修改时间，文件改动后自动失效
+        private final Map<String, CompilationUnit> cuCache =
+                new LinkedHashMap<String, CompilationUnit>(CU_CACHE_SIZE, 0.75f, true) {
+                    @Override
+                    protected boolean removeEldestEntry(Map.Entry<String, CompilationUnit> eldest) {
+                        return size() > CU_CACHE_SIZE;
+                    }
+                };
+
+        // py4j 为每个客户端连接开一个线程，只在访问缓存时加锁，解析本身可以并行
+        private CompilationUnit parseFile(String filePath) throws Exception {
+            File file = new File(filePath);
+            String key = file.getAbsolutePath() + "@" + file.lastModified();
+            CompilationUnit cu;
+            synchronized (cuCache) {
+                cu = cuCache.get(key);
+            }
+            if (cu == null) {
+                String code = new String(Files.readAllBytes(Paths.get(filePath)), StandardCharsets.UTF_8);
+                cu = StaticJavaParser.parse(code);
+                synchronized (cuCache) {
+                    cuCache.put(key, cu);
+                }
+            }
+            return cu;
+        }
+
+        /**
+         * 批量接口：一个文件只解析一次，提取其中所有请求的方法
+         * requests: 每行一个 "className\tmethodName\tparamSignature"
+         * 返回: 与请求顺序一致的方法代码，以 '\0' 分隔，未找到为空串，解析失败时每项为 "ERROR: ..."
+         */
+        public String extractMethodsFromFile(String filePath, String requests) {
+            String[] lines = requests.split("\n", -1);
+            String[] results = new String[lines.length];
+            CompilationUnit cu;
+            try {
+                cu = parseFile(filePath);
+            } catch (Exception e) {
+                e.printStackTrace();
+                Arrays.fill(results, "ERROR: " + e.getMessage());
+                return String.join("\0", results);
+            }
+            for (int i = 0; i < lines.length; i++) {
+                String[] fields = lines[i].split("\t", -1);
+                if (fields.length < 3) {
+                    results[i] = "ERROR: bad request " + lines[i];
+                    continue;
+                }
+                try {
+                    MethodFinder finder = new MethodFinder(fields[0], fields[1], fields[2]);
+                    finder.visit(cu, null);
+                    String methodCode = finder.getMethodCode();
+                    results[i] = methodCode == null ? "" : methodCode;
+                } catch (Exception e) {
+                    e.printStackTrace();
+                    results[i] = "ERROR: " + e.getMessage();
+                }
+            }
+            return String.join("\0", results);
+        }
+
         /**
          * 根据文件代码内容进行解析（新版接口）
          */
@@ -127,8 +199,9 @@ public class MethodExtractorGateway {
 
     public static void main(String[] args) {
         MethodExtractor extractor = new MethodExtractor();
-        GatewayServer server = new GatewayServer(extractor);
+        int port = args.length > 0 ? Integer.parseInt(args[0]) : GatewayServer.DEFAULT_PORT;
+        GatewayServer server = new GatewayServer(extractor, port);
         server.start();
-        System.out.println("Py4J Java Gateway Server Started...");
+        System.out.println("Py4J Java Gateway Server Started on port " + port + "...");
     }
 }
\ No newline at end of file
@@ -0,0 +1,81 @@
+package com.example;
+
+import py4j.GatewayServer;
+
+import java.util.List;
+
+/**
+ * 在同一个 JVM、同一个端口上同时提供 MethodExtractorGateway 和 JavaParserServer 的接口，
+ * 源码匹配和 CFG 分析两个阶段、所有入口函数共用这一个进程，省去每个阶段重新启动 JVM 的开销。
+ * 启动完成后在标准输出打印 READY_MARKER，Python 端据此判断就绪，不再依赖固定的 sleep。
+ */
+public class ParserGateway {
+    public static final String READY_MARKER = "GATEWAY_READY";
+
+    private final MethodExtractorGateway.MethodExtractor extractor = new MethodExtractorGateway.MethodExtractor();
+
+    // ====================== MethodExtractorGateway ======================
+    public String extractMethodsFromFile(String filePath, String requests) {
+        return extractor.extractMethodsFromFile(filePath, requests);
+    }
+
+    public String extractMethodFromCode(String code, String className, String methodName, String paramSignature) {
+        return extractor.extractMethodFromCode(code, className, methodName, paramSignature);
+    }
+
+    // ====================== JavaParserServer ======================
+    // JavaParserServer 的实例状态不能被 py4j 的并发调用共享，每次调用使用新实例
+    public List<String> analyzeControlFlow(String code) {
+        return new JavaParserServer().analyzeControlFlow(code);
+    }
+
+    public String analyzeControlFlowAsString(String code) {
+        return new JavaParserServer().analyzeControlFlowAsString(code);
+    }
+
+    public String analyzeControlFlowBatch(String codes) {
+        return new JavaParserServer().analyzeControlFlowBatch(codes);
+    }
+
+    public String analyzeControlFlowBounded(String code, int maxPaths, int timeBudgetMs) {
+        return new JavaParserServer().analyzeControlFlowBounded(code, maxPaths, timeBudgetMs);
+    }
+
+    public String analyzeControlFlowBatchBounded(String codes, int maxPaths, int timeBudgetMs) {
+        return new JavaParserServer().analyzeControlFlowBatchBounded(codes, maxPaths, timeBudgetMs);
+    }
+
+    public String analyzeControlFlowLogOnly(String code, String logCallees, int maxPaths, int timeBudgetMs) {
+        return new JavaParserServer().analyzeControlFlowLogOnly(code, logCallees, maxPaths, timeBudgetMs);
+    }
+
+    public String analyzeControlFlowBatchLogOnly(String codes, String logCallees, int maxPaths, int timeBudgetMs) {
+        return new JavaParserServer().analyzeControlFlowBatchLogOnly(codes, logCallees, maxPaths, timeBudgetMs);
+    }
+
+    /**
+     * 训练运行：走一遍源码提取和 CFG 分析后直接退出，配合 -XX:ArchiveClassesAtExit 生成 AppCDS 归档，
+     * 归档里包含 JavaParser 和 CFG 分析用到的类，之后的启动直接映射这些类而不再加载、校验。
+     */
+    static void warmup() {
+        String code = "class Warmup { void run(int n) { for (int i = 0; i < n; i++) { if (i > 1) { LOG.info(\"i {}\", i); }"
+                + " else { try { work(i); } catch (Exception e) { throw new RuntimeException(e); } } } } }";
+        ParserGateway gateway = new ParserGateway();
+        gateway.extractMethodFromCode(code, "Warmup", "run", "(int)");
+        gateway.analyzeControlFlowBatchBounded(code, 10, 1000);
+        gateway.analyzeControlFlowBatchLogOnly(code, "work", 10, 1000);
+    }
+
+    public static void main(String[] args) {
+        if (args.length > 0 && "--warmup".equals(args[0])) {
+            warmup();
+            return;
+        }
+        int port = args.length > 0 ? Integer.parseInt(args[0]) : GatewayServer.DEFAULT_PORT;
+        GatewayServer server = new GatewayServer(new ParserGateway(), port);
+        // start() 在返回前已经绑定端口，此后客户端即可连接
+        server.start();
+        System.out.println(READY_MARKER + " port=" + server.getListeningPort());
+        System.out.flush();
+    }
+}
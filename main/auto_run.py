@@ -4,8 +4,12 @@ import subprocess
 import shutil
 import argparse
 import time
-import signal
-import socket
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from call_dep import generate_and_prune_call_sequences
+from call_graph_index import CallGraphIndex
+from callee_memo import CalleeMemo, default_memo_path
+from db_access import load_pool_size, open_store
+from gateway_supervisor import GatewaySupervisor
 
 def get_entry_name(entry):
  
@@ -46,108 +50,69 @@ def create_output_dirs(project_dir, entry_functions):
     return output_dir, entry_dirs
 
 
-def extract_call_deps(entry_functions, output_dir,depth,batch_size=2):
-  
+def extract_call_deps(entry_functions, output_dir,depth,workers=None,graph_index=None,batch_frontier=False):
+    """
+    run call_dep for every entry inside this process on a pool of workers (default: the configured db pool size),
+    the graph index is loaded once and shared, without it every worker takes a pooled db connection
+    and the entries share one callee memo (output_dir/callee_memo.db) so common subtrees are fetched once,
+    reused by later runs only while the method_call table keeps the same fingerprint
+    """
     total_entries = len(entry_functions)
+    if workers is None:
+        workers = load_pool_size()
     print(f"all address {total_entries} entry ")
-    
-
-    for i in range(0, total_entries, batch_size):
-        batch = entry_functions[i:i + batch_size] 
-        print(f"processing {i // batch_size + 1} ,call{len(batch)} entry")
-
-      
-        for entry in batch:
-            simple_entry_name = get_entry_name(entry)
-            entry_output_dir = os.path.join(output_dir, simple_entry_name)
-            subprocess.run(['python3', 'main/call_dep.py', '--entry_function', entry, '--output_dir', f'{entry_output_dir}', '--depth', str(depth)])
-        
-        print(f" {i // batch_size + 1} finish ,waiting")
-        time.sleep(3)  
-
-def wait_for_port(port, host='127.0.0.1', timeout=60):
-    """waiting for the port to be open"""
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            result = sock.connect_ex((host, port))
-            if result == 0:
-                print(f"Java Gateway is ready on port {port}")
-                return True
-        time.sleep(1)
-        print("Waiting for Java Gateway to start...")
-    return False
-
-def parse_and_match_source_code(entry_functions, output_dir,project_dir):
-    print("Starting MethodExtractorGateWay")
-    subprocess.run(['pkill', '-f', 'com.example.(MethodExtractorGateway|JavaParserServer)'], check=False)
-    time.sleep(2)  
-
-    # 1. 创建日志文件，用来查看 Java 端的报错
-    java_log_file = open("java_gateway_debug.log", "w")
-
-    # 2. 启动 Java Gateway，并重定向输出到日志文件
-    java_gateway = subprocess.Popen(
-        ['mvn', 'exec:java', '-Dexec.mainClass=com.example.MethodExtractorGateway'],
-        cwd='java-parser',
-        stdout=java_log_file, # 关键：把标准输出写入文件
-        stderr=java_log_file  # 关键：把错误输出写入文件
-    )
-    time.sleep(5)  
-
-    try:
-        if not wait_for_port(25333):
-            print("Error: Java Gateway failed to start in 60 seconds.")
-            print("Please check 'java_gateway_debug.log' for details.")
-            return # exit 
-
-        for entry in entry_functions:
-            simple_entry_name = get_entry_name(entry)
-            entry_output_dir = os.path.join(output_dir, simple_entry_name)
-            print(f"Processing source code matching for entry: {entry}")
-            subprocess.run(['python3', 'main/match_source_code_v2.py', '--call_chain_file', f'{entry_output_dir}/pruned_call_deps.txt','--project_dir',project_dir,'--output_dir', entry_output_dir])
-    finally:
-        if java_gateway:
-            java_gateway.terminate()
+    graph = CallGraphIndex.load(graph_index) if graph_index else None
+    memo = None
+    if graph is None:
+        db = open_store()
+        try:
+            fingerprint = db.fingerprint()
+        finally:
+            db.close()
+        memo = CalleeMemo(default_memo_path(output_dir), fingerprint=fingerprint)
+
+    def run_entry(entry):
+        entry_output_dir = os.path.join(output_dir, get_entry_name(entry))
+        generate_and_prune_call_sequences(entry, entry_output_dir, depth, graph, batch_frontier, memo)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_entry, entry): entry for entry in entry_functions}
+        for done, future in enumerate(as_completed(futures), 1):
+            entry = futures[future]
             try:
-                java_gateway.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                java_gateway.kill()
-        if java_log_file:
-            java_log_file.close()
-        print("MethodExtractorGateway Closed")
-        
+                future.result()
+                print(f"{done}/{total_entries} finish {entry}")
+            except Exception as e:
+                print(f"{done}/{total_entries} call_dep failed for {entry}: {e}")
+    if memo is not None:
+        memo.close()
+
+def parse_and_match_source_code(entry_functions, output_dir,project_dir,extract_workers=1):
+    # the gateway is started by default_process and shared with generate_cfg_and_log_seq
+    for entry in entry_functions:
+        simple_entry_name = get_entry_name(entry)
+        entry_output_dir = os.path.join(output_dir, simple_entry_name)
+        print(f"Processing source code matching for entry: {entry}")
+        subprocess.run(['python3', 'main/match_source_code_v2.py', '--call_chain_file', f'{entry_output_dir}/pruned_call_deps.txt','--project_dir',project_dir,'--output_dir', entry_output_dir,'--workers',str(extract_workers)])
+
 
-def generate_cfg_and_log_seq(entry_functions, output_dir):
+def generate_cfg_and_log_seq(entry_functions, output_dir, log_only=False):
     print("code mapping...")
- 
-    subprocess.run(['pkill', '-f', 'com.example.(MethodExtractorGateway|JavaParserServer)'], check=False)
-    time.sleep(2)  
-    java_server = subprocess.Popen(
-        ['mvn', 'compile', 'exec:java', '-Dexec.mainClass=com.example.JavaParserServer'],
-        cwd='java-parser'
-    )
-    time.sleep(6)  
-
-    try:
-        for entry in entry_functions:
-            simple_entry_name = get_entry_name(entry)
-            entry_output_dir = os.path.join(output_dir, simple_entry_name)
-            subprocess.run(['python3', 'main/create_node_info.py', '--call_chain_file', f'{entry_output_dir}/pruned_call_deps.txt', '--source_mapping', f'{entry_output_dir}/extracted_methods.json', '--output_dir', entry_output_dir])
-
-    finally:
-        java_server.send_signal(signal.SIGTERM)
-        java_server.wait(timeout=7)
-        print("JavaParserServer Closed")
-        time.sleep(3)  
+    for entry in entry_functions:
+        simple_entry_name = get_entry_name(entry)
+        entry_output_dir = os.path.join(output_dir, simple_entry_name)
+        command = ['python3', 'main/create_node_info.py', '--call_chain_file', f'{entry_output_dir}/pruned_call_deps.txt', '--source_mapping', f'{entry_output_dir}/extracted_methods.json', '--output_dir', entry_output_dir]
+        if log_only:
+            command.append('--log_only')
+        subprocess.run(command)
         
 ## Stage 3: Merge and stimulate log Sequence ##
-def merge_results(entry_functions, output_dir):
+def merge_results(entry_functions, output_dir, merge_workers=1, merge_strategy="fold"):
     print("merging...")
     for entry in entry_functions:
         simple_entry_name = get_entry_name(entry)
         entry_output_dir = os.path.join(output_dir, simple_entry_name)
-        subprocess.run(['python3', 'main/merge_node.py', '--call_chain_file', f'{entry_output_dir}/pruned_call_deps.txt', '--source_mapping', f'{entry_output_dir}/extracted_methods.json', '--single_call_path', f'{entry_output_dir}/prune_call_path_javaparser.json', '--output_dir', entry_output_dir])
+        subprocess.run(['python3', 'main/merge_node.py', '--call_chain_file', f'{entry_output_dir}/pruned_call_deps.txt', '--source_mapping', f'{entry_output_dir}/extracted_methods.json', '--single_call_path', f'{entry_output_dir}/prune_call_path_javaparser.json', '--output_dir', entry_output_dir, '--workers', str(merge_workers), '--merge_strategy', merge_strategy])
 
 
 def merge_results_without_cot(entry_functions, output_dir):
@@ -165,11 +130,15 @@ def merge_results_without_static_analysis(entry_functions, output_dir):
         subprocess.run(['python3', 'main/ablation_merge_node_v2.py', '--call_chain_file', f'{entry_output_dir}/pruned_call_deps.txt', '--source_mapping', f'{entry_output_dir}/extracted_methods.json', '--output_dir', entry_output_dir])
 
 
-def default_process(project_dir,entry_functions, output_dir,depth):
-    extract_call_deps(entry_functions, output_dir,depth)
-    parse_and_match_source_code(entry_functions, output_dir,project_dir)
-    generate_cfg_and_log_seq(entry_functions, output_dir)
-    merge_results(entry_functions, output_dir)
+def default_process(project_dir,entry_functions, output_dir,depth,graph_index=None,batch_frontier=False,workers=None,
+                    extract_workers=1,log_only=False,merge_workers=1,merge_strategy="fold"):
+    extract_call_deps(entry_functions, output_dir,depth,workers=workers,graph_index=graph_index,batch_frontier=batch_frontier)
+    # one JVM serves source matching and CFG analysis of every entry
+    with GatewaySupervisor() as gateway:
+        parse_and_match_source_code(entry_functions, output_dir,project_dir,extract_workers)
+        generate_cfg_and_log_seq(entry_functions, output_dir, log_only)
+    merge_results(entry_functions, output_dir, merge_workers, merge_strategy)
+    return gateway.startup_seconds
 
 
 def main():
@@ -177,6 +146,13 @@ def main():
     parser.add_argument('--project_dir', type=str, required=True, help="input project dir")
     parser.add_argument('--entry_functions', nargs='+', required=True, help="entries")
     parser.add_argument('--depth', type=int,required=False,default=3, help="depth, default 3")
+    parser.add_argument('--graph_index', type=str,required=False,default=None, help="call graph index built by path_store_and_prune, query db if not set")
+    parser.add_argument('--batch_frontier', action='store_true', help="without --graph_index, query the db once per depth level instead of once per caller")
+    parser.add_argument('--workers', type=int,required=False,default=None, help="entries traversed in parallel, default: [mysql] pool_size of mysql/config.ini, beyond it they wait for a free connection")
+    parser.add_argument('--extract_workers', type=int,required=False,default=os.cpu_count() or 1, help="java files extracted concurrently by the source matching gateway, default: number of cores")
+    parser.add_argument('--log_only', action='store_true', help="project the CFG paths on logging before they reach the merge prompts")
+    parser.add_argument('--merge_workers', type=int,required=False,default=1, help="call graph nodes merged concurrently once their callees are merged, 1 keeps the sequential merge")
+    parser.add_argument('--merge_strategy', choices=['fold', 'tree', 'batch'], default='fold', help="tree: combine the children of a node pairwise in parallel before merging it; batch: merge a node with all its children in as few prompts as fit, see merge_node.py")
     # parser.add_argument('--input_dir',type=str,required=True,help="output dir of javacallgraph")
     args = parser.parse_args()
 
@@ -205,13 +181,15 @@ def main():
             need_entry_functions.append(entry)
     
     output_dir, entry_dirs = create_output_dirs(project_dir,need_entry_functions)
-    default_process(project_dir,need_entry_functions, output_dir,depth)
+    gateway_startup = default_process(project_dir,need_entry_functions, output_dir,depth,args.graph_index,args.batch_frontier,args.workers,args.extract_workers,args.log_only,args.merge_workers,args.merge_strategy)
     
     print("all the task done!")
 
     end_time = time.time()  
     print(f"All we address entry function:{len(need_entry_functions)}")
     print(f"All use time: {end_time - start_time:.2f} seconds.")
+    if gateway_startup is not None:
+        print(f"Java gateway startup: {gateway_startup:.2f} seconds.")
     if len(need_entry_functions) > 0:
         print(f"average time per entry: {(end_time - start_time)/len(need_entry_functions):.2f} seconds.")
     else:
@@ -1,59 +1,84 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import mysql.connector
-import configparser
 import logging
 import argparse
 import os
 import re
+from call_graph_index import CallGraphIndex
+from callee_memo import CalleeMemo
+from db_access import open_store, log_query_stats, MAX_IN_PARAMS
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def load_db_config(config_file='mysql/config.ini'):
-
-    config = configparser.ConfigParser()
-    config.read(config_file)
-    return {
-        'host': config.get('mysql', 'host'),
-        'port': config.getint('mysql', 'port'),
-        'user': config.get('mysql', 'user'),
-        'password': config.get('mysql', 'password'),
-        'database': config.get('mysql', 'database'),
-        'charset': 'utf8mb4'
-    }
+def fetch_callees_from_db(db, caller):
+    return db.fetch_callees(caller)
 
-def fetch_callees_from_db(cursor, caller):
-    query = """
-    SELECT callee FROM method_call 
-    WHERE caller = %s AND enabled = 1 AND log_propagation = 1 
-    ORDER BY call_seq;
+def prefetch_callees_by_level(db, entry_function, max_depth, chunk_size=MAX_IN_PARAMS, memo=None):
+    """
+    level-synchronous prefetch: one WHERE caller IN (...) query per frontier chunk and depth level,
+    covers every node the depth-limited traversal below can expand
+    memo: a CalleeMemo, callers already in it are not queried again
     """
-    # query = """
-    # SELECT callee FROM method_call 
-    # WHERE caller = %s AND enabled = 1
-    # ORDER BY call_seq;
-    # """
-    cursor.execute(query, (caller,))
-    return [row["callee"] for row in cursor.fetchall()]
+    callee_cache = {}
+    frontier = [entry_function]
+    queries = 0
+    for depth in range(max_depth):
+        if not frontier:
+            break
+        missing = frontier
+        if memo is not None:
+            missing = []
+            for caller in frontier:
+                callees = memo.get(caller)
+                if callees is None:
+                    missing.append(caller)
+                else:
+                    callee_cache[caller] = callees
+        if missing:
+            fetched = db.fetch_callees_batch(missing, chunk_size)
+            queries += (len(missing) + chunk_size - 1) // chunk_size
+            callee_cache.update(fetched)
+            if memo is not None:
+                memo.put_many(fetched)
+        next_frontier = []
+        queued = set()
+        for caller in frontier:
+            for callee in callee_cache[caller]:
+                if callee not in callee_cache and callee not in queued:
+                    queued.add(callee)
+                    next_frontier.append(callee)
+        logging.info(f"Depth {depth}: fetched callees of {len(missing)} / {len(frontier)} callers")
+        frontier = next_frontier
+    logging.info(f"Prefetched {len(callee_cache)} callers in {queries} queries")
+    return callee_cache
 
 def test_calldep(caller):
-    db_config = load_db_config()
-    cnx = mysql.connector.connect(**db_config)
-    cursor = cnx.cursor(dictionary=True)
-    callee = fetch_callees_from_db(cursor,caller)
+    db = open_store()
+    callee = fetch_callees_from_db(db,caller)
     print(callee)
-    cursor.close()
-    cnx.close()
+    db.close()
 
 def test_call(caller):
     generate_call_sequences_from_entry(entry_function=caller,max_depth=2)
 
-def generate_call_sequences_from_entry(entry_function, output_file="output/call_deps.txt", max_depth=10):
-
-    db_config = load_db_config()
-    cnx = mysql.connector.connect(**db_config)
-    cursor = cnx.cursor(dictionary=True)
+def generate_call_sequences_from_entry(entry_function, output_file="output/call_deps.txt", max_depth=10, graph=None,
+                                       batch_frontier=False, memo=None):
+    # graph: a CallGraphIndex, when given no query goes to the db
+    # batch_frontier: query the db once per depth level instead of once per caller, same output
+    # memo: a CalleeMemo shared across entries, callee lists already fetched are not queried again
+    db = None
+    if graph is not None:
+        fetch_callees = graph.callees
+    else:
+        db = open_store()
+        if batch_frontier:
+            callee_cache = prefetch_callees_by_level(db, entry_function, max_depth, memo=memo)
+            fetch_callees = lambda caller: callee_cache.get(caller, [])
+        elif memo is not None:
+            fetch_callees = lambda caller: memo.fetch(caller, lambda c: fetch_callees_from_db(db, c))
+        else:
+            fetch_callees = lambda caller: fetch_callees_from_db(db, caller)
 
     stack = [(entry_function, 0)]  
     visited = set()  
@@ -74,7 +99,7 @@ def generate_call_sequences_from_entry(entry_function, output_file="output/call_
             visited.add(current)
             in_stack.add(current)
 
-            callees = fetch_callees_from_db(cursor, current)
+            callees = fetch_callees(current)
 
             for callee in callees:
                 f.write(f"{current}->{callee}, depth {depth + 1}\n") 
@@ -85,8 +110,9 @@ def generate_call_sequences_from_entry(entry_function, output_file="output/call_
 
             in_stack.remove(current)
 
-    cursor.close()
-    cnx.close()
+    if db is not None:
+        db.close()
+        log_query_stats()
     logging.info(f"Call sequences have been stored in file: {output_file}")
 
 
@@ -214,14 +240,15 @@ def validate_pruned_graph(pruned_edges, relevant_nodes):
     print("pruned successfully")
 
 
-def generate_and_prune_call_sequences(entry_function, output_dir="output", max_depth=3):
+def generate_and_prune_call_sequences(entry_function, output_dir="output", max_depth=3, graph=None, batch_frontier=False,
+                                      memo=None):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     call_dep_file = os.path.join(output_dir, "call_deps.txt")
     pruned_file = os.path.join(output_dir, "pruned_call_deps.txt")
 
     
-    generate_call_sequences_from_entry(entry_function, call_dep_file, max_depth)
+    generate_call_sequences_from_entry(entry_function, call_dep_file, max_depth, graph, batch_frontier, memo)
 
    
     call_graph_with_depth, all_callees = parse_call_file(call_dep_file)
@@ -245,13 +272,21 @@ def main():
     parser.add_argument('--output_dir', type=str, required=False,default="output",help="output dir")
     parser.add_argument('--depth', type=int, required=False,default=3,help="analyze depth")
     parser.add_argument('--entry_function', type=str, required=True,help="set entry function")
+    parser.add_argument('--graph_index', type=str, required=False,default=None,help="call graph index built by path_store_and_prune, query db if not set")
+    parser.add_argument('--memo_file', type=str, required=False,default=None,help="without --graph_index, sqlite file caching fetched callee lists across runs")
+    parser.add_argument('--batch_frontier', action='store_true', help="without --graph_index, fetch callees of a whole depth level per query instead of one caller per query")
     args = parser.parse_args()
     
     output_dir = args.output_dir
     depth = args.depth
     entry_function = args.entry_function
+    graph = CallGraphIndex.load(args.graph_index) if args.graph_index else None
+
+    memo = CalleeMemo(args.memo_file) if args.memo_file and graph is None else None
 
-    generate_and_prune_call_sequences(entry_function,output_dir,depth)
+    generate_and_prune_call_sequences(entry_function,output_dir,depth,graph,args.batch_frontier,memo)
+    if memo is not None:
+        memo.close()
 
 if __name__ == "__main__":
     main()
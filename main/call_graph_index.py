@@ -0,0 +1,483 @@
+import os
+import mmap
+import time
+import struct
+import logging
+from collections import deque
+from array import array
+from collections.abc import Mapping, Sequence
+
+# file layout (native byte order, every section 8-byte aligned):
+#   header: magic, num_nodes, num_edges, string blob size
+#   str_offsets q[n+1] | str_blob | fwd_offsets q[n+1] | fwd_targets i[m] | call_seq q[m]
+#   | enabled B[m] | log_propagation B[m] | rev_offsets q[n+1] | rev_edges i[m]
+MAGIC = b"CGIDX002"
+HEADER = struct.Struct("=8sqqq")
+
+
+class CallGraphIndex:
+    """
+    compressed-sparse-row index of the method_call table
+        - signatures: interned signature strings sorted, position == node id
+        - fwd_offsets/fwd_targets: caller -> callee edges, ordered by call_seq
+        - rev_offsets/rev_edges: callee -> forward edge ids, ordered by call_seq
+        - call_seq/enabled/log_propagation: one slot per forward edge
+    """
+
+    def __init__(self, signatures, fwd_offsets, fwd_targets, call_seq, enabled, log_propagation,
+                 rev_offsets, rev_edges):
+        self.signatures = signatures
+        self.fwd_offsets = fwd_offsets
+        self.fwd_targets = fwd_targets
+        self.call_seq = call_seq
+        self.enabled = enabled
+        self.log_propagation = log_propagation
+        self.rev_offsets = rev_offsets
+        self.rev_edges = rev_edges
+        self._mmap = None
+
+    @property
+    def num_nodes(self):
+        return len(self.signatures)
+
+    @property
+    def num_edges(self):
+        return len(self.fwd_targets)
+
+    @classmethod
+    def from_rows(cls, rows, marked_nodes=None):
+        """
+        rows: (call_seq, enabled, caller, callee, ...) tuples, as produced by load_graph_from_file
+        marked_nodes: callers whose edges get log_propagation = 1
+        """
+        ids = {}
+        signatures = []
+
+        def intern(sig):
+            node_id = ids.get(sig)
+            if node_id is None:
+                node_id = len(signatures)
+                ids[sig] = node_id
+                signatures.append(sig)
+            return node_id
+
+        src = array('i')
+        dst = array('i')
+        seq = array('q')
+        enabled = bytearray()
+        log_propagation = bytearray()
+        for row in rows:
+            caller, callee = row[2], row[3]
+            src.append(intern(caller))
+            dst.append(intern(callee))
+            # NULL call_seq sorts first, as in mysql ORDER BY
+            seq.append(row[0] if row[0] is not None else -1)
+            enabled.append(1 if row[1] == 1 else 0)
+            log_propagation.append(1 if marked_nodes is not None and caller in marked_nodes else 0)
+
+        num_nodes = len(signatures)
+        num_edges = len(src)
+
+        # renumber so that ids follow signature order, lookups then need no hash table
+        order = sorted(range(num_nodes), key=signatures.__getitem__)
+        remap = array('i', [0]) * num_nodes
+        for new_id, old_id in enumerate(order):
+            remap[old_id] = new_id
+        signatures = [signatures[old_id] for old_id in order]
+        src = array('i', (remap[i] for i in src))
+        dst = array('i', (remap[i] for i in dst))
+
+        fwd_order = sorted(range(num_edges), key=lambda e: (src[e], seq[e]))
+        fwd_offsets = cls._offsets(src, num_nodes)
+        fwd_targets = array('i', (dst[e] for e in fwd_order))
+        fwd_seq = array('q', (seq[e] for e in fwd_order))
+        fwd_enabled = bytearray(enabled[e] for e in fwd_order)
+        fwd_log_propagation = bytearray(log_propagation[e] for e in fwd_order)
+
+        # reverse edges point at the forward edge slot so the bit columns are shared
+        rev_order = sorted(range(num_edges), key=lambda e: (fwd_targets[e], fwd_seq[e]))
+        rev_offsets = cls._offsets(fwd_targets, num_nodes)
+        rev_edges = array('i', rev_order)
+
+        logging.info(f"Call graph index built. Nodes: {num_nodes}, edges: {num_edges}")
+        return cls(signatures, fwd_offsets, fwd_targets, fwd_seq, fwd_enabled, fwd_log_propagation,
+                   rev_offsets, rev_edges)
+
+    @staticmethod
+    def _offsets(keys, num_nodes):
+        offsets = array('q', [0]) * (num_nodes + 1)
+        for k in keys:
+            offsets[k + 1] += 1
+        for i in range(num_nodes):
+            offsets[i + 1] += offsets[i]
+        return offsets
+
+    def node_id(self, signature):
+        key = signature.encode("utf-8")
+        raw = self.signatures.raw if isinstance(self.signatures, _StringTable) else None
+        lo, hi = 0, self.num_nodes
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = raw(mid) if raw else self.signatures[mid].encode("utf-8")
+            if probe < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.num_nodes and (raw(lo) if raw else self.signatures[lo].encode("utf-8")) == key:
+            return lo
+        return None
+
+    def _edge_ok(self, edge, enabled_only, log_propagation_only):
+        if enabled_only and not self.enabled[edge]:
+            return False
+        if log_propagation_only and not self.log_propagation[edge]:
+            return False
+        return True
+
+    def callees(self, caller, enabled_only=True, log_propagation_only=True):
+        """same result as SELECT callee ... WHERE caller = %s AND enabled = 1 AND log_propagation = 1 ORDER BY call_seq"""
+        node = self.node_id(caller)
+        if node is None:
+            return []
+        return [self.signatures[self.fwd_targets[e]]
+                for e in range(self.fwd_offsets[node], self.fwd_offsets[node + 1])
+                if self._edge_ok(e, enabled_only, log_propagation_only)]
+
+    def callers(self, callee, enabled_only=True, log_propagation_only=True):
+        """same result as SELECT caller ... WHERE callee = %s AND enabled = 1 AND log_propagation = 1 ORDER BY call_seq"""
+        node = self.node_id(callee)
+        if node is None:
+            return []
+        result = []
+        for i in range(self.rev_offsets[node], self.rev_offsets[node + 1]):
+            e = self.rev_edges[i]
+            if self._edge_ok(e, enabled_only, log_propagation_only):
+                result.append(self.signatures[self._edge_source(e)])
+        return result
+
+    def _edge_source(self, edge):
+        # binary search the caller owning a forward edge slot
+        lo, hi = 0, self.num_nodes
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.fwd_offsets[mid + 1] <= edge:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def callee_map(self, enabled_only=True, log_propagation_only=True):
+        """read-only {caller: set(callees)} view, for code written against the in-memory dicts"""
+        return _CalleeMap(self, enabled_only, log_propagation_only)
+
+    def save(self, path):
+        blob = bytearray()
+        str_offsets = array('q', [0])
+        for sig in self.signatures:
+            blob += sig.encode("utf-8")
+            str_offsets.append(len(blob))
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.num_nodes, self.num_edges, len(blob)))
+            for section in (str_offsets, bytes(blob), self.fwd_offsets, self.fwd_targets, self.call_seq,
+                            bytes(self.enabled), bytes(self.log_propagation), self.rev_offsets, self.rev_edges):
+                _write_aligned(f, section)
+        logging.info(f"Call graph index saved to {path}")
+
+    @classmethod
+    def load(cls, path, writable=False):
+        """mmap the index file, arrays are zero-copy views so loading does not depend on graph size"""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Call graph index {path} not found.")
+        with open(path, "r+b" if writable else "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        magic, num_nodes, num_edges, blob_size = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            mm.close()
+            raise ValueError(f"{path} is not a call graph index (or was written by an older version), rebuild it with path_store_and_prune.py")
+
+        sections, _ = _map_sections(memoryview(mm), num_nodes, num_edges, blob_size)
+        index = cls(_StringTable(sections["str_offsets"], sections["str_blob"]),
+                    *(sections[name] for name, _, _ in SECTIONS[2:]))
+        index._mmap = mm
+        logging.info(f"Call graph index mapped from {path}. Nodes: {num_nodes}, edges: {num_edges}")
+        return index
+
+    @classmethod
+    def build_streaming(cls, chunks, path, writable=False):
+        """
+        build the index file from chunks of method_call rows without holding the rows in memory
+        a 7th row column, if present, is taken as the edge's log_propagation flag
+        memory is O(nodes) for the interned signatures plus one chunk; edges are spilled to disk
+        and placed straight into the mmap of the output file
+        """
+        ids = {}
+        signatures = []
+        out_degree = array('q')
+        in_degree = array('q')
+
+        def intern(sig):
+            node_id = ids.get(sig)
+            if node_id is None:
+                node_id = len(signatures)
+                ids[sig] = node_id
+                signatures.append(sig)
+                out_degree.append(0)
+                in_degree.append(0)
+            return node_id
+
+        # pass 1: intern and spill (src, dst, call_seq, enabled, log_propagation) columns
+        spill_paths = [f"{path}.spill.{name}" for name in ("src", "dst", "seq", "enabled", "log_propagation")]
+        # the spill files go away however the build ends, pass 1 included
+        try:
+            spill_files = [open(p, "wb") for p in spill_paths]
+            num_edges = 0
+            start_time = time.time()
+            try:
+                for chunk in chunks:
+                    src, dst, seq, enabled, log_propagation = array('i'), array('i'), array('q'), array('b'), array('b')
+                    for row in chunk:
+                        s, d = intern(row[2]), intern(row[3])
+                        src.append(s)
+                        dst.append(d)
+                        seq.append(row[0] if row[0] is not None else -1)
+                        enabled.append(1 if row[1] == 1 else 0)
+                        log_propagation.append(1 if len(row) > 6 and row[6] else 0)
+                        out_degree[s] += 1
+                        in_degree[d] += 1
+                    for col, f in zip((src, dst, seq, enabled, log_propagation), spill_files):
+                        col.tofile(f)
+                    num_edges += len(src)
+                    elapsed = time.time() - start_time
+                    logging.info(f"Streamed {num_edges} rows, {len(signatures)} nodes, {num_edges / max(elapsed, 1e-9):.0f} rows/sec")
+            finally:
+                for f in spill_files:
+                    f.close()
+            ids = None
+
+            num_nodes = len(signatures)
+            order = sorted(range(num_nodes), key=signatures.__getitem__)
+            remap = array('i', [0]) * num_nodes
+            for new_id, old_id in enumerate(order):
+                remap[old_id] = new_id
+
+            blob_size = 0
+            for sig in signatures:
+                blob_size += len(sig.encode("utf-8"))
+            _, total_size = _map_sections(None, num_nodes, num_edges, blob_size)
+            with open(path, "wb") as f:
+                f.truncate(total_size)
+            with open(path, "r+b") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE)
+            HEADER.pack_into(mm, 0, MAGIC, num_nodes, num_edges, blob_size)
+            sec, _ = _map_sections(memoryview(mm), num_nodes, num_edges, blob_size)
+
+            str_offsets, str_blob = sec["str_offsets"], sec["str_blob"]
+            pos = 0
+            for new_id, old_id in enumerate(order):
+                raw = signatures[old_id].encode("utf-8")
+                str_blob[pos:pos + len(raw)] = raw
+                pos += len(raw)
+                str_offsets[new_id + 1] = pos
+            signatures = order = None
+
+            fwd_offsets, rev_offsets = sec["fwd_offsets"], sec["rev_offsets"]
+            for old_id in range(num_nodes):
+                fwd_offsets[remap[old_id] + 1] = out_degree[old_id]
+                rev_offsets[remap[old_id] + 1] = in_degree[old_id]
+            out_degree = in_degree = None
+            for i in range(num_nodes):
+                fwd_offsets[i + 1] += fwd_offsets[i]
+                rev_offsets[i + 1] += rev_offsets[i]
+
+            # pass 2: place spilled edges into their caller's slot range, file order kept per caller
+            targets, call_seq, enabled = sec["fwd_targets"], sec["call_seq"], sec["enabled"]
+            log_propagation = sec["log_propagation"]
+            cursor = array('q', fwd_offsets[:num_nodes])
+            spill_files = [open(p, "rb") for p in spill_paths]
+            try:
+                remaining = num_edges
+                while remaining:
+                    n = min(remaining, SPILL_READ_SIZE)
+                    cols = [array(t) for t in ('i', 'i', 'q', 'b', 'b')]
+                    for col, f in zip(cols, spill_files):
+                        col.fromfile(f, n)
+                    src, dst, seq, en, lp = cols
+                    for k in range(n):
+                        s = remap[src[k]]
+                        e = cursor[s]
+                        cursor[s] = e + 1
+                        targets[e] = remap[dst[k]]
+                        call_seq[e] = seq[k]
+                        enabled[e] = en[k]
+                        log_propagation[e] = lp[k]
+                    remaining -= n
+            finally:
+                for f in spill_files:
+                    f.close()
+        finally:
+            for p in spill_paths:
+                if os.path.exists(p):
+                    os.remove(p)
+        _sort_slots_by_seq(fwd_offsets, num_nodes, lambda e: call_seq[e], (targets, call_seq, enabled, log_propagation))
+
+        rev_edges = sec["rev_edges"]
+        cursor = array('q', rev_offsets[:num_nodes])
+        for e in range(num_edges):
+            t = targets[e]
+            rev_edges[cursor[t]] = e
+            cursor[t] += 1
+        _sort_slots_by_seq(rev_offsets, num_nodes, lambda e: call_seq[rev_edges[e]], (rev_edges,))
+
+        sec = str_offsets = str_blob = fwd_offsets = rev_offsets = None
+        targets = call_seq = enabled = log_propagation = rev_edges = None
+        mm.flush()
+        mm.close()
+        logging.info(f"Call graph index streamed to {path}. Nodes: {num_nodes}, edges: {num_edges}, "
+                     f"{time.time() - start_time:.2f} seconds")
+        return cls.load(path, writable)
+
+    def touches_enabled_edge(self, node):
+        for e in range(self.fwd_offsets[node], self.fwd_offsets[node + 1]):
+            if self.enabled[e]:
+                return True
+        for i in range(self.rev_offsets[node], self.rev_offsets[node + 1]):
+            if self.enabled[self.rev_edges[i]]:
+                return True
+        return False
+
+    def reverse_reachable(self, start_ids):
+        """BFS over enabled reverse edges, returns a bytearray bitmap of marked node ids"""
+        marked = bytearray(self.num_nodes)
+        queue = deque()
+        for node in start_ids:
+            if not marked[node]:
+                marked[node] = 1
+                queue.append(node)
+        while queue:
+            current = queue.popleft()
+            for i in range(self.rev_offsets[current], self.rev_offsets[current + 1]):
+                e = self.rev_edges[i]
+                if not self.enabled[e]:
+                    continue
+                pred = self._edge_source(e)
+                if not marked[pred]:
+                    marked[pred] = 1
+                    queue.append(pred)
+        return marked
+
+    def set_log_propagation(self, marked):
+        """marked: bitmap over node ids, edges of marked callers get log_propagation = 1"""
+        for node in range(self.num_nodes):
+            value = 1 if marked[node] else 0
+            for e in range(self.fwd_offsets[node], self.fwd_offsets[node + 1]):
+                self.log_propagation[e] = value
+        if self._mmap is not None:
+            self._mmap.flush()
+
+
+SECTIONS = [
+    # name, element format, count in "n"odes+1 / "m" edges / "b" blob bytes
+    ("str_offsets", 'q', "n"),
+    ("str_blob", 'B', "b"),
+    ("fwd_offsets", 'q', "n"),
+    ("fwd_targets", 'i', "m"),
+    ("call_seq", 'q', "m"),
+    ("enabled", 'B', "m"),
+    ("log_propagation", 'B', "m"),
+    ("rev_offsets", 'q', "n"),
+    ("rev_edges", 'i', "m"),
+]
+
+SPILL_READ_SIZE = 1 << 20
+
+
+def _map_sections(view, num_nodes, num_edges, blob_size):
+    """slice a mapped index into typed views; with view=None only the total file size is computed"""
+    counts = {"n": num_nodes + 1, "m": num_edges, "b": blob_size}
+    sections = {}
+    pos = HEADER.size
+    for name, fmt, count_key in SECTIONS:
+        nbytes = struct.calcsize(fmt) * counts[count_key]
+        if view is not None:
+            section = view[pos:pos + nbytes]
+            sections[name] = section.cast(fmt) if fmt != 'B' else section
+        pos = _align(pos + nbytes)
+    return sections, pos
+
+
+def _sort_slots_by_seq(offsets, num_nodes, key, columns):
+    # stable sort of every node's slot range, ties keep the order they were placed in
+    for node in range(num_nodes):
+        a, b = offsets[node], offsets[node + 1]
+        if b - a < 2:
+            continue
+        order = sorted(range(a, b), key=key)
+        if all(order[i] == a + i for i in range(b - a)):
+            continue
+        for col in columns:
+            col[a:b] = array(col.format, [col[e] for e in order])
+
+
+def _align(pos):
+    return (pos + 7) & ~7
+
+
+def _write_aligned(f, section):
+    data = section.tobytes() if hasattr(section, "tobytes") else section
+    f.write(data)
+    pad = _align(len(data)) - len(data)
+    if pad:
+        f.write(b"\0" * pad)
+
+
+class _StringTable(Sequence):
+    """signatures stored as one utf-8 blob plus offsets, decoded on access"""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def raw(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.raw(i).decode("utf-8")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+class _CalleeMap(Mapping):
+    def __init__(self, index, enabled_only, log_propagation_only):
+        self.index = index
+        self.enabled_only = enabled_only
+        self.log_propagation_only = log_propagation_only
+
+    def __getitem__(self, caller):
+        callees = self.index.callees(caller, self.enabled_only, self.log_propagation_only)
+        if not callees:
+            raise KeyError(caller)
+        return set(callees)
+
+    def __contains__(self, caller):
+        try:
+            self[caller]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        for sig in self.index.signatures:
+            if sig in self:
+                yield sig
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def default_index_path(input_dir):
+    return os.path.join(input_dir, "call_graph.idx")
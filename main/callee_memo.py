@@ -0,0 +1,91 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 200000
+
+
+class CalleeMemo:
+    """
+    caller -> callees (enabled, log_propagation, call_seq order) shared by every entry of a run
+        - in memory: LRU bounded by max_entries
+        - on disk (optional): sqlite file reused by later runs while the fingerprint of the method_call table
+          (CallStore.fingerprint) is the one it was filled from, emptied when it differs
+    the edges written to call_deps.txt depend on what the entry already visited, so the callee lists are what
+    can be shared: entries reaching the same subtree fetch it from the db once
+    """
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES, fingerprint=None):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        if path:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute("CREATE TABLE IF NOT EXISTS callee_memo (caller TEXT PRIMARY KEY, callees TEXT)")
+            self._disk.execute("CREATE TABLE IF NOT EXISTS memo_meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._check_fingerprint(fingerprint)
+
+    def _check_fingerprint(self, fingerprint):
+        # callee lists memoized from another database, or before a prune/import changed the table, are stale
+        row = self._disk.execute("SELECT value FROM memo_meta WHERE key = 'fingerprint'").fetchone()
+        if fingerprint is not None and row is not None and row[0] == fingerprint:
+            return
+        if row is not None:
+            logging.info(f"Callee memo: the method_call table changed ({row[0]} -> {fingerprint}), dropping it")
+        self._disk.execute("DELETE FROM callee_memo")
+        self._disk.execute("INSERT OR REPLACE INTO memo_meta VALUES ('fingerprint', ?)", (fingerprint,))
+        self._disk.commit()
+
+    def _remember(self, caller, callees):
+        self._lru[caller] = callees
+        self._lru.move_to_end(caller)
+        if len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def get(self, caller):
+        with self._lock:
+            callees = self._lru.get(caller)
+            if callees is not None:
+                self._lru.move_to_end(caller)
+            elif self._disk is not None:
+                row = self._disk.execute("SELECT callees FROM callee_memo WHERE caller = ?", (caller,)).fetchone()
+                if row is not None:
+                    callees = json.loads(row[0])
+                    self._remember(caller, callees)
+            if callees is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return callees
+
+    def put_many(self, callees_by_caller):
+        with self._lock:
+            for caller, callees in callees_by_caller.items():
+                self._remember(caller, callees)
+            if self._disk is not None:
+                self._disk.executemany("INSERT OR REPLACE INTO callee_memo VALUES (?, ?)",
+                                       [(caller, json.dumps(callees)) for caller, callees in callees_by_caller.items()])
+                self._disk.commit()
+
+    def fetch(self, caller, fetch_callees):
+        callees = self.get(caller)
+        if callees is None:
+            callees = fetch_callees(caller)
+            self.put_many({caller: callees})
+        return callees
+
+    def close(self):
+        logging.info(f"Callee memo: {self.hits} hits, {self.misses} misses")
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+
+def default_memo_path(output_dir):
+    return os.path.join(output_dir, "callee_memo.db")
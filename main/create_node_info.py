@@ -3,7 +3,7 @@ import json
 import re
 import argparse
 import time
-from java_parser_client import analyze_java_code
+from java_parser_client import analyze_java_code, analyze_java_codes, check_gateway
 from models.prompts.analysis_code import get_java_parser_with_llm
 from models.prompts.generate_node_info import generate_node_log_seq_v2
 from models.get_resp import get_response
@@ -117,6 +117,22 @@ def process_single_node(signature, simple_call_graph, code_map):
     # node_log_seq = get_single_node_log(info)
     return signature, node_info
 
+def get_method_name(signature):
+    return signature.split(":", 1)[-1].split("(")[0]
+
+def process_node_batch(signatures, code_map, max_paths=0, time_budget_ms=0, simple_call_graph=None):
+    """
+    one gateway round trip for a whole batch of nodes
+    simple_call_graph given: log-only projection, the children of a node in the pruned call chain are its log-propagating callees
+    """
+    log_callees = None
+    if simple_call_graph is not None:
+        log_callees = [sorted({get_method_name(child) for child in simple_call_graph.get(signature, [])})
+                       for signature in signatures]
+    node_infos = analyze_java_codes([code_map[signature]['source_code'] for signature in signatures],
+                                    max_paths, time_budget_ms, log_callees)
+    return list(zip(signatures, (str(node_info) for node_info in node_infos)))
+
 def test():
     call_file = "output/hadoop/MRAppMaster_main/pruned_call_deps.txt"
     call_graph_with_depth, all_callees = parse_call_file(call_file)
@@ -156,6 +172,10 @@ def main():
     parser.add_argument('--call_chain_file', type=str, required=True,help="sub graph file")
     parser.add_argument('--source_mapping', type=str, required=True,help="source_code mapping file path")
     parser.add_argument('--output_dir', type=str, required=True,help="output dir of mapping json")
+    parser.add_argument('--batch_size', type=int, required=False,default=100,help="nodes sent to JavaParserServer per call")
+    parser.add_argument('--max_paths', type=int, required=False,default=0,help="CFG paths per method, one per distinct log/call sequence (e.g. 200); 0 enumerates every path as before")
+    parser.add_argument('--time_budget_ms', type=int, required=False,default=0,help="path enumeration time per method with --max_paths (e.g. 2000); 0: no limit")
+    parser.add_argument('--log_only', action='store_true', help="keep only log calls, exceptions, log-propagating calls and the conditions guarding them in the paths")
     
     args = parser.parse_args()
 
@@ -185,20 +205,24 @@ def main():
         collect_tasks_dfs(root, simple_call_graph, code_map, visited, tasks_to_run)
 
     print(f"Found {len(tasks_to_run)} nodes with source code to analyze.")
+    if tasks_to_run and not check_gateway():
+        print("Warning: JavaParserServer is not answering, nodes keep their source code")
 
     single_call_path_json = {}
     
-    ## set a thread pool to address llm call
+    ## batches of nodes analyzed in one RPC each, two batches in flight
+    batches = [tasks_to_run[i:i + args.batch_size] for i in range(0, len(tasks_to_run), args.batch_size)]
     with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-        future_to_sig = {executor.submit(process_single_node, sig, simple_call_graph, code_map): sig for sig in tasks_to_run}
-        for future in concurrent.futures.as_completed(future_to_sig):
-            sig = future_to_sig[future]
+        future_to_batch = {executor.submit(process_node_batch, batch, code_map, args.max_paths, args.time_budget_ms,
+                                                  simple_call_graph if args.log_only else None): batch for batch in batches}
+        for future in concurrent.futures.as_completed(future_to_batch):
+            batch = future_to_batch[future]
             try:
-                signature, node_info = future.result()
-                single_call_path_json[signature] = node_info
-                print(f"+++ Successfully processed: {signature} +++")
+                for signature, node_info in future.result():
+                    single_call_path_json[signature] = node_info
+                print(f"+++ Successfully processed {len(batch)} nodes +++")
             except Exception as exc:
-                print(f"!!! Task for {sig} generated an exception: {exc} !!!")
+                print(f"!!! Batch starting at {batch[0]} generated an exception: {exc} !!!")
     
     single_call_path = os.path.join(output_dir,"prune_call_path_javaparser.json")
     with open(single_call_path, "w", encoding="utf-8") as f:
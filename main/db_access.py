@@ -0,0 +1,341 @@
+import os
+import time
+import sqlite3
+import logging
+import weakref
+import threading
+import configparser
+from contextlib import contextmanager
+
+SUPPORTED_BACKENDS = ("mysql", "sqlite", "duckdb")
+# placeholders per IN (...) list, below the sqlite host parameter limit of older builds (999)
+MAX_IN_PARAMS = 500
+DEFAULT_POOL_SIZE = 4
+# seconds open_store waits for a pooled mysql connection while all of them are lent out
+POOL_WAIT_TIMEOUT = 600
+
+# query name -> [calls, total seconds], shared by every store of the process
+QUERY_STATS = {}
+_query_stats_lock = threading.Lock()
+_pools = {}
+# mysql connection -> its prepared cursors, kept while the pool lends the connection to one store after another
+_prepared_cursors = weakref.WeakKeyDictionary()
+
+
+@contextmanager
+def timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _query_stats_lock:
+            stat = QUERY_STATS.setdefault(name, [0, 0.0])
+            stat[0] += 1
+            stat[1] += elapsed
+
+
+def log_query_stats():
+    with _query_stats_lock:
+        stats = [(name, tuple(stat)) for name, stat in QUERY_STATS.items()]
+    for name, (calls, seconds) in sorted(stats, key=lambda item: -item[1][1]):
+        logging.info(f"[query] {name}: {calls} calls, {seconds:.3f} s total, {1000 * seconds / calls:.3f} ms avg")
+
+
+def load_db_config(config_file='mysql/config.ini'):
+    config = configparser.ConfigParser()
+    if not os.path.exists(config_file):
+        raise FileNotFoundError(f"Config file {config_file} not found.")
+    config.read(config_file)
+    db_conf = {
+        'host': config.get('mysql', 'host'),
+        'port': config.getint('mysql', 'port'),
+        'user': config.get('mysql', 'user'),
+        'password': config.get('mysql', 'password'),
+        'database': config.get('mysql', 'database'),
+        'charset': 'utf8mb4'
+    }
+    return db_conf
+
+
+def load_pool_size(config_file='mysql/config.ini'):
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return config.getint('mysql', 'pool_size', fallback=DEFAULT_POOL_SIZE)
+
+
+def load_storage_config(config_file='mysql/config.ini'):
+    """ [storage] backend = mysql | sqlite | duckdb, path = embedded db file """
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    backend = config.get('storage', 'backend', fallback='mysql').strip().lower()
+    if backend not in SUPPORTED_BACKENDS:
+        raise ValueError(f"Unsupported storage backend: {backend}, choose one of {SUPPORTED_BACKENDS}")
+    path = config.get('storage', 'path', fallback='output/callpath.db').strip()
+    return backend, path
+
+
+MYSQL_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS `method_call` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `call_seq` int DEFAULT NULL,
+      `enabled` tinyint DEFAULT NULL,
+      `caller` text,
+      `callee` text,
+      `call_line_no` int DEFAULT NULL,
+      `call_return_type` text,
+      `log_propagation` tinyint DEFAULT '0',
+      PRIMARY KEY (`id`),
+      INDEX `caller_idx` (`caller`(255)),
+      INDEX `callee_idx` (`callee`(255))
+    ) ENGINE=InnoDB;
+"""
+
+# embedded backends have no server side prefix index limits, the traversal queries are answered
+# from these covering indexes alone
+EMBEDDED_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS method_call (
+      call_seq INTEGER,
+      enabled INTEGER,
+      caller TEXT,
+      callee TEXT,
+      call_line_no INTEGER,
+      call_return_type TEXT,
+      log_propagation INTEGER DEFAULT 0
+    )
+"""
+EMBEDDED_INDEX_DDL = [
+    "CREATE INDEX IF NOT EXISTS caller_cover_idx ON method_call (caller, enabled, log_propagation, call_seq, callee)",
+    "CREATE INDEX IF NOT EXISTS callee_cover_idx ON method_call (callee, enabled, log_propagation, call_seq, caller)",
+]
+
+
+class CallStore:
+    """
+    the method_call table behind mysql, sqlite or duckdb
+    sql is written once with %s placeholders and translated for the embedded backends
+    """
+
+    def __init__(self, backend, cnx, error_class, location=""):
+        self.backend = backend
+        self.location = location
+        self.cnx = cnx
+        self.Error = error_class
+        self._cursor = cnx.cursor()
+        # one cursor per hot lookup, on mysql a server side prepared statement that stays prepared
+        # for the lifetime of the pooled connection, not just of this store
+        if backend == "mysql":
+            self._prepared = _prepared_cursors.setdefault(getattr(cnx, "_cnx", cnx), {})
+        else:
+            self._prepared = {}
+
+    def _sql(self, sql):
+        return sql if self.backend == "mysql" else sql.replace("%s", "?")
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(self._sql(sql), params)
+        return self._cursor
+
+    def executemany(self, sql, rows):
+        self._cursor.executemany(self._sql(sql), rows)
+
+    def query(self, sql, params=()):
+        return self.execute(sql, params).fetchall()
+
+    def commit(self):
+        self.cnx.commit()
+
+    def close(self):
+        """for mysql this hands the connection back to the pool, its prepared cursors stay with it"""
+        if self.backend != "mysql":
+            for cursor in self._prepared.values():
+                cursor.close()
+        self._cursor.close()
+        self.cnx.close()
+
+    def _query_prepared(self, name, sql, params):
+        with timed(name):
+            try:
+                return self._run_prepared(name, sql, params)
+            except self.Error as e:
+                if self.backend != "mysql":
+                    raise
+                # the pooled connection reconnected (e.g. after wait_timeout) and the server forgot its
+                # prepared statements, or it dropped just now: prepare again on a live connection, once
+                logging.warning(f"prepared {name} failed ({e}), preparing it again")
+                self._discard_prepared()
+                if not self.cnx.is_connected():
+                    self.cnx.reconnect()
+                return self._run_prepared(name, sql, params)
+
+    def _run_prepared(self, name, sql, params):
+        cursor = self._prepared.get(name)
+        if cursor is None:
+            cursor = self.cnx.cursor(prepared=True) if self.backend == "mysql" else self.cnx.cursor()
+            self._prepared[name] = cursor
+        cursor.execute(self._sql(sql), params)
+        return cursor.fetchall()
+
+    def _discard_prepared(self):
+        # every statement of the connection is stale, not just the one that failed
+        for cursor in self._prepared.values():
+            try:
+                cursor.close()
+            except self.Error:
+                pass
+        self._prepared.clear()
+
+    def fetch_callees(self, caller):
+        rows = self._query_prepared("fetch_callees", """
+            SELECT callee FROM method_call
+            WHERE caller = %s AND enabled = 1 AND log_propagation = 1
+            ORDER BY call_seq
+        """, (caller,))
+        return [row[0] for row in rows]
+
+    def fetch_callers(self, callee):
+        rows = self._query_prepared("fetch_callers", """
+            SELECT caller FROM method_call
+            WHERE callee = %s AND enabled = 1 AND log_propagation = 1
+            ORDER BY call_seq
+        """, (callee,))
+        return [row[0] for row in rows]
+
+    def fetch_callees_batch(self, callers, chunk_size=MAX_IN_PARAMS):
+        """caller -> callees ordered by call_seq for every given caller, one query per chunk_size callers"""
+        callers = list(callers)
+        result = {caller: [] for caller in callers}
+        for i in range(0, len(callers), chunk_size):
+            chunk = callers[i:i + chunk_size]
+            placeholders = ','.join(['%s'] * len(chunk))
+            with timed("fetch_callees_batch"):
+                rows = self.query(f"""
+                    SELECT caller, callee FROM method_call
+                    WHERE caller IN ({placeholders}) AND enabled = 1 AND log_propagation = 1
+                    ORDER BY call_seq
+                """, chunk)
+            for caller, callee in rows:
+                result[caller].append(callee)
+        return result
+
+    def fetch_edges(self, log_propagation_only=True):
+        """(caller, callee) of every enabled edge"""
+        sql = "SELECT caller, callee FROM method_call WHERE enabled = 1"
+        if log_propagation_only:
+            sql += " AND log_propagation = 1"
+        cursor = self.execute(sql)
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            yield from rows
+
+    def fingerprint(self):
+        """
+        backend, database and a summary of method_call (rows, enabled rows, log_propagation rows);
+        it changes whenever a writer imports, prunes or marks the table, caches of query results compare it
+        """
+        with timed("fingerprint"):
+            rows, enabled, propagating = self.query(
+                "SELECT COUNT(*), SUM(enabled), SUM(log_propagation) FROM method_call")[0]
+        return f"{self.backend}:{self.location}:{rows}:{enabled or 0}:{propagating or 0}"
+
+    def reset_method_call_table(self):
+        """create method_call (with its lookup indexes) if missing, and empty it"""
+        if self.backend == "mysql":
+            self.execute(MYSQL_TABLE_DDL)
+            self.ensure_log_propagation_column()
+            self.execute("TRUNCATE TABLE method_call")
+        else:
+            self.execute(EMBEDDED_TABLE_DDL)
+            self.execute("DELETE FROM method_call")
+            for ddl in EMBEDDED_INDEX_DDL:
+                self.execute(ddl)
+        self.commit()
+
+    def ensure_log_propagation_column(self):
+        if self.backend == "mysql":
+            self.execute("SHOW COLUMNS FROM method_call LIKE 'log_propagation'")
+            exists = self._cursor.fetchone() is not None
+        elif self.backend == "sqlite":
+            exists = any(row[1] == "log_propagation" for row in self.query("PRAGMA table_info(method_call)"))
+        else:
+            exists = bool(self.query(
+                "SELECT 1 FROM information_schema.columns WHERE table_name = 'method_call' AND column_name = 'log_propagation'"))
+        if not exists:
+            logging.info("log_propagation not exists adding now ...")
+            self.execute("ALTER TABLE method_call ADD COLUMN log_propagation TINYINT DEFAULT 0"
+                         if self.backend == "mysql" else
+                         "ALTER TABLE method_call ADD COLUMN log_propagation INTEGER DEFAULT 0")
+            self.commit()
+
+    def insert_rows(self, rows):
+        """rows: (call_seq, enabled, caller, callee, call_line_no, call_return_type, log_propagation)"""
+        with timed("insert_rows"):
+            self.executemany(
+                "INSERT INTO method_call "
+                "(call_seq, enabled, caller, callee, call_line_no, call_return_type, log_propagation) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)", rows)
+            self.commit()
+
+    def mark_callers(self, callers):
+        """set log_propagation = 1 on every row of the given callers"""
+        callers = list(callers)
+        if not callers:
+            return
+        placeholders = ','.join(['%s'] * len(callers))
+        with timed("mark_callers"):
+            self.execute(f"UPDATE method_call SET log_propagation = 1 WHERE caller IN ({placeholders})", callers)
+            self.commit()
+
+
+def _mysql_pool(config_file, mysql_options):
+    from mysql.connector import pooling
+    key = (os.path.abspath(config_file), tuple(sorted(mysql_options.items())))
+    if key not in _pools:
+        _pools[key] = pooling.MySQLConnectionPool(pool_name=f"callpath_{len(_pools)}",
+                                                  pool_size=load_pool_size(config_file),
+                                                  # a session reset would deallocate the prepared statements
+                                                  pool_reset_session=False,
+                                                  **load_db_config(config_file), **mysql_options)
+    return _pools[key]
+
+
+def open_store(config_file='mysql/config.ini', **mysql_options):
+    """
+    mysql connections come from one pool per config file and options, close() returns them;
+    when more stores are open than pool_size, open_store waits for one to be closed
+    """
+    backend, path = load_storage_config(config_file)
+    if backend == "mysql":
+        import mysql.connector
+        from mysql.connector.errors import PoolError
+        pool = _mysql_pool(config_file, mysql_options)
+        deadline = time.time() + POOL_WAIT_TIMEOUT
+        while True:
+            try:
+                cnx = pool.get_connection()
+                break
+            except PoolError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.05)
+        db_conf = load_db_config(config_file)
+        return CallStore(backend, cnx, mysql.connector.Error,
+                         f"{db_conf['host']}:{db_conf['port']}/{db_conf['database']}")
+
+    db_dir = os.path.dirname(path)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir)
+    if backend == "sqlite":
+        cnx = sqlite3.connect(path)
+        cnx.execute("PRAGMA journal_mode=WAL")
+        cnx.execute("PRAGMA synchronous=NORMAL")
+        return CallStore(backend, cnx, sqlite3.Error, os.path.abspath(path))
+
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("storage backend duckdb needs the duckdb package: pip install duckdb")
+    cnx = duckdb.connect(path)
+    return CallStore(backend, cnx, duckdb.Error, os.path.abspath(path))
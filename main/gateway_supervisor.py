@@ -0,0 +1,143 @@
+import os
+import glob
+import time
+import socket
+import logging
+import threading
+import subprocess
+
+JAVA_PARSER_DIR = "java-parser"
+MAIN_CLASS = "com.example.ParserGateway"
+READY_MARKER = "GATEWAY_READY"
+DEFAULT_PORT = 25333
+FAT_JAR_PATTERN = "*-all.jar"
+STALE_GATEWAYS = "com.example.(MethodExtractorGateway|JavaParserServer|ParserGateway)"
+
+
+def newest_mtime(paths):
+    return max((os.path.getmtime(path) for path in paths), default=0)
+
+
+def build_gateway_jar(java_dir=JAVA_PARSER_DIR):
+    """
+    the shaded jar with every dependency (target/*-all.jar), maven only runs when a source or pom.xml
+    is newer than the jar
+    """
+    pom = os.path.join(java_dir, "pom.xml")
+    sources = glob.glob(os.path.join(java_dir, "src", "main", "java", "**", "*.java"), recursive=True)
+    jars = glob.glob(os.path.join(java_dir, "target", FAT_JAR_PATTERN))
+    if not jars or newest_mtime(sources + [pom]) > newest_mtime(jars):
+        print("Packaging java-parser...")
+        subprocess.run(['mvn', '-q', 'package', '-DskipTests'], cwd=java_dir, check=True)
+        jars = glob.glob(os.path.join(java_dir, "target", FAT_JAR_PATTERN))
+    return os.path.abspath(max(jars, key=os.path.getmtime))
+
+
+def build_cds_archive(jar):
+    """
+    AppCDS archive of the classes a warmup run loads (JDK 13+, -XX:ArchiveClassesAtExit), rebuilt with the jar;
+    None when the JVM cannot dump one, the gateway then starts without it; the failure is remembered in
+    a .jsa.failed marker next to the jar so the warmup only runs once per jar build
+    """
+    archive = os.path.splitext(jar)[0] + ".jsa"
+    failed_marker = archive + ".failed"
+    if os.path.exists(archive) and os.path.getmtime(archive) >= os.path.getmtime(jar):
+        return archive
+    if os.path.exists(failed_marker) and os.path.getmtime(failed_marker) >= os.path.getmtime(jar):
+        return None
+    result = subprocess.run(['java', f'-XX:ArchiveClassesAtExit={archive}', '-cp', jar, MAIN_CLASS, '--warmup'],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if result.returncode != 0 or not os.path.exists(archive):
+        logging.warning(f"no class data sharing archive, the JVM could not create {archive}:\n{result.stdout}")
+        with open(failed_marker, "w", encoding="utf-8") as marker:
+            marker.write(result.stdout)
+        return None
+    return archive
+
+
+def port_in_use(port, host='127.0.0.1'):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        return sock.connect_ex((host, port)) == 0
+
+
+class GatewaySupervisor:
+    """
+    one long-lived JVM serving both source extraction and CFG analysis (com.example.ParserGateway) on port,
+    started from the fat jar with java -cp and its AppCDS archive; ready once the JVM prints READY_MARKER,
+    its output goes to log_file, startup_seconds is the time from launch to ready
+        with GatewaySupervisor():
+            ... every stage and entry talks to the same gateway ...
+    """
+
+    def __init__(self, java_dir=JAVA_PARSER_DIR, port=DEFAULT_PORT, log_file="java_gateway_debug.log",
+                 startup_timeout=60):
+        self.java_dir = java_dir
+        self.port = port
+        self.log_file = log_file
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.startup_seconds = None
+        self._ready = threading.Event()
+        self._pump = None
+
+    def _release_port(self):
+        # a gateway left over by an earlier run would answer instead of ours
+        if not port_in_use(self.port):
+            return
+        logging.warning(f"port {self.port} is busy, stopping stale gateways")
+        subprocess.run(['pkill', '-f', STALE_GATEWAYS], check=False)
+        deadline = time.time() + 10
+        while port_in_use(self.port):
+            if time.time() > deadline:
+                raise RuntimeError(f"port {self.port} is still in use")
+            time.sleep(0.1)
+
+    def _pump_output(self):
+        with open(self.log_file, "w", encoding="utf-8") as log:
+            for line in self.process.stdout:
+                log.write(line)
+                log.flush()
+                if line.startswith(READY_MARKER):
+                    self._ready.set()
+
+    def start(self):
+        self._release_port()
+        jar = build_gateway_jar(self.java_dir)
+        archive = build_cds_archive(jar)
+        command = ['java']
+        if archive:
+            command += ['-Xshare:auto', f'-XX:SharedArchiveFile={archive}']
+        start_time = time.time()
+        self.process = subprocess.Popen(
+            command + ['-cp', jar, MAIN_CLASS, str(self.port)],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+        self._pump = threading.Thread(target=self._pump_output, daemon=True)
+        self._pump.start()
+        while not self._ready.wait(0.05):
+            if self.process.poll() is not None or time.time() - start_time > self.startup_timeout:
+                self.stop()
+                raise RuntimeError(f"Java gateway did not start, see {self.log_file}")
+        self.startup_seconds = time.time() - start_time
+        print(f"Java gateway ready on port {self.port} in {self.startup_seconds:.2f} seconds"
+              f"{'' if archive else ' (no CDS archive)'}")
+        return self
+
+    def stop(self):
+        if self.process is None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        if self._pump is not None:
+            self._pump.join(timeout=5)
+        self.process = None
+        print("Java gateway closed")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -1,46 +1,25 @@
-import mysql.connector
-import configparser
 import logging
 import os
 import json
 import hashlib
+import argparse
+from call_graph_index import CallGraphIndex
+from db_access import open_store
 
 logging.basicConfig(filename="callgraph_code.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 
-def load_db_config(config_file='mysql/config.ini'):
-
-    config = configparser.ConfigParser()
-    config.read(config_file)
-    return {
-        'host': config.get('mysql', 'host'),
-        'port': config.getint('mysql', 'port'),
-        'user': config.get('mysql', 'user'),
-        'password': config.get('mysql', 'password'),
-        'database': config.get('mysql', 'database'),
-        'charset': 'utf8mb4'
-    }
-
 def load_signature_file(signature_file='signatures.json'):
     with open(signature_file, 'r') as file:
         data = json.load(file)
         return data  # 返回签名列表
 
-def fetch_all_call_relationships(cursor):
-  
-    query = """
-    SELECT caller, callee 
-    FROM method_call 
-    WHERE enabled = 1 AND log_propagation = 1
-    """
-    cursor.execute(query)
+def fetch_all_call_relationships(db):
     
-  
+    caller_to_callees = {}
     callee_to_callers = {}
 
-    for row in cursor.fetchall():
-        caller = row["caller"]
-        callee = row["callee"]
+    for caller, callee in db.fetch_edges():
 
         if caller not in caller_to_callees:
             caller_to_callees[caller] = set()
@@ -91,19 +70,19 @@ def save_call_graph(call_graph, output_dir):
                 for callee in callees:
                     f.write(f"{caller}->{callee}\n")
 
-def process_call_graph(output_dir="output", signature_file='signatures.json', depth=4):
+def process_call_graph(output_dir="output", signature_file='signatures.json', depth=4, graph_index=None):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
  
-    db_config = load_db_config()
-    cnx = mysql.connector.connect(**db_config)
-    cursor = cnx.cursor(dictionary=True)
-    
-   
+    db = None
     signatures = load_signature_file(signature_file)
     
- 
-    caller_to_callees, callee_to_callers = fetch_all_call_relationships(cursor)
+    if graph_index:
+        # expand only the nodes reached from the signatures instead of pulling the whole table
+        caller_to_callees = CallGraphIndex.load(graph_index).callee_map()
+    else:
+        db = open_store()
+        caller_to_callees, callee_to_callers = fetch_all_call_relationships(db)
     
 
     call_graph = construct_simple_call_graph(caller_to_callees, signatures, max_depth=depth)
@@ -111,13 +90,16 @@ def process_call_graph(output_dir="output", signature_file='signatures.json', de
     save_call_graph(call_graph, output_dir)
 
     print(f"Processed call graph for {len(signatures)} signatures.")
-    cursor.close()
-    cnx.close()
+    if db is not None:
+        db.close()
     logging.info(f"Call graph processing completed. Call graphs saved to {output_dir}")
 
 
 def main():
-    process_call_graph(output_dir="output/subgraph", signature_file='output/depth_3_calls.json', depth=4)
+    parser = argparse.ArgumentParser(description="generate sub graph for signatures")
+    parser.add_argument('--graph_index', type=str, required=False, default=None, help="call graph index built by path_store_and_prune, query db if not set")
+    args = parser.parse_args()
+    process_call_graph(output_dir="output/subgraph", signature_file='output/depth_3_calls.json', depth=4, graph_index=args.graph_index)
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,9 @@
 import sys
 import re
+import threading
 from py4j.java_gateway import JavaGateway
 from py4j.java_collections import JavaList, JavaObject
+from py4j.protocol import Py4JNetworkError
 import json
 import logging
 logging.basicConfig(filename='failed_parsing.log', level=logging.ERROR,format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,34 +23,139 @@ def has_method_body(java_code):
     return bool(pattern.search(code))
 
 
+# one JavaGateway per process, its GatewayClient keeps a pool of socket connections and lends one to each
+# calling thread, so ThreadPoolExecutor workers share it safely
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = JavaGateway()
+        return _gateway
+
+
+def reset_gateway(failed=None):
+    """
+    drop the pooled connections, the next call reconnects;
+    failed: the gateway a call failed on, when another thread already replaced it the current one is kept
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is not None and (failed is None or failed is _gateway):
+            try:
+                _gateway.close()
+            except Exception:
+                pass
+            _gateway = None
+
+
+def check_gateway():
+    """health check: one cheap RPC, reset the client if the server does not answer"""
+    gateway = get_gateway()
+    try:
+        gateway.jvm.System.currentTimeMillis()
+        return True
+    except Py4JNetworkError:
+        reset_gateway(gateway)
+        return False
+
+
+def call_gateway(method_name, *args, retries=1):
+    """call entry_point.method_name, reconnecting after a network error (e.g. the server was restarted)"""
+    for attempt in range(retries + 1):
+        gateway = get_gateway()
+        try:
+            return getattr(gateway.entry_point, method_name)(*args)
+        except Py4JNetworkError:
+            reset_gateway(gateway)
+            if attempt == retries:
+                raise
+
+
+def wrap_method(java_code):
+    return f"""
+package com.example;
+import org.slf4j.Logger;
+import org.slf4j.LoggerFactory;
+public class MyClass {{ {java_code} }}"""
+
+
 def analyze_java_code(java_code):
     if not has_method_body(java_code):
         error_message = f"no method body,代码内容:\n{java_code}"
         print(error_message)
         logging.error(error_message)
         return java_code
-    gateway = JavaGateway()
-    JavaListType = gateway.jvm.java.util.List
-    java_parser_server = gateway.entry_point
-    full_code = f"""
-package com.example;
-import org.slf4j.Logger;
-import org.slf4j.LoggerFactory;
-public class MyClass {{ {java_code} }}"""
+    full_code = wrap_method(java_code)
 
     print("full_code.......")
     print(full_code)
 
     try:
-        controlflow = java_parser_server.analyzeControlFlow(full_code)
-        controlflow = str(controlflow)
-        return controlflow
+        # a single RPC per node, the paths come back joined and are formatted here
+        controlflow = call_gateway("analyzeControlFlowAsString", full_code)
+        return format_paths(controlflow)
     except Exception as e:
         error_message = f"分析 Java 代码时发生异常，跳过该函数。错误信息: {e}\n代码内容:\n{java_code}"
         print(error_message)
         logging.error(error_message)
         return java_code
 
+STATS_SEPARATOR = "\x01"
+PATH_SEPARATOR = "\x02"
+
+
+def format_paths(joined):
+    """the PATH_SEPARATOR joined paths of the server as str(list), the format str(JavaList) gave"""
+    return str(joined.split(PATH_SEPARATOR) if joined else [])
+
+
+def analyze_java_codes(java_codes, max_paths=0, time_budget_ms=0, log_callees=None):
+    """
+    analyze_java_code for many methods in one RPC: bodies go out '\0' separated, path lists come back the same way
+    a method without body or failing on the server keeps its source code, like analyze_java_code
+    max_paths > 0: bounded enumeration on the server, one path per distinct LOG/CALL/NEW sequence,
+    at most max_paths paths and time_budget_ms per method, truncated methods are reported with their stats
+    log_callees: one list of method names per java code, the log-propagating callees of that method;
+    given, the server projects the paths on logging (log calls, exceptions, calls to those callees and the
+    branch conditions before them) and 0 budgets mean no limit
+    """
+    results = list(java_codes)
+    indexes = []
+    for i, java_code in enumerate(java_codes):
+        if has_method_body(java_code):
+            indexes.append(i)
+        else:
+            logging.error(f"no method body,代码内容:\n{java_code}")
+    if not indexes:
+        return results
+    try:
+        codes = "\0".join(wrap_method(java_codes[i]) for i in indexes)
+        if log_callees is not None:
+            callees = "\0".join("\n".join(log_callees[i]) for i in indexes)
+            reply = call_gateway("analyzeControlFlowBatchLogOnly", codes, callees, max_paths, time_budget_ms)
+        elif max_paths > 0:
+            reply = call_gateway("analyzeControlFlowBatchBounded", codes, max_paths, time_budget_ms)
+        else:
+            reply = call_gateway("analyzeControlFlowBatch", codes)
+        controlflows = reply.split("\0")
+    except Exception as e:
+        logging.error(f"分析 Java 代码时发生异常，跳过该批 {len(indexes)} 个函数。错误信息: {e}")
+        return results
+    for i, controlflow in zip(indexes, controlflows):
+        if controlflow.startswith("ERROR:"):
+            logging.error(f"分析 Java 代码时发生异常，跳过该函数。错误信息: {controlflow}\n代码内容:\n{java_codes[i]}")
+            continue
+        controlflow, sep, stats = controlflow.partition(STATS_SEPARATOR)
+        if sep and "truncated=none" not in stats:
+            print(f"path enumeration truncated ({stats}) for:\n{java_codes[i][:200]}")
+        results[i] = format_paths(controlflow)
+    return results
+
+
 def main():
     source_code=""" /**
    * Create the common {@link ContainerLaunchContext} for all attempts.
@@ -5,33 +5,22 @@ import logging
 from py4j.java_gateway import JavaGateway
 import configparser
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from source_index import SourceIndex, default_source_index_path
+from method_source_cache import MethodSourceCache, default_method_cache_path
 logging.basicConfig(filename="match_source_code.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 
-def locate_source_code_file_path(caller_method,project_dir):
+def locate_source_code_file_path(caller_method,project_dir,source_index=None):
+    # source_index: a SourceIndex of project_dir, without it the tree is walked for this one lookup
     try:
         parts = caller_method.split(":")
         if len(parts) < 2:
             return None, None
         class_full = parts[0].strip()
-        if "$" in class_full:
-            outer_class = class_full.split("$")[0]
-        else:
-            outer_class = class_full
-        simple_name = outer_class.split(".")[-1]
-        candidate_filename = simple_name + ".java"
-        package_dirs = class_full.split(".")[:-1]
-
-        found_path = None
-        for root, dirs, files in os.walk(project_dir):
-            if candidate_filename in files:
-                candidate_path = os.path.join(root, candidate_filename)
-                match_count = sum(1 for pkg in package_dirs if pkg in candidate_path)
-                if match_count >= len(package_dirs):
-                    found_path = candidate_path
-                    break
-                if not found_path:
-                    found_path = candidate_path
+        if source_index is None:
+            source_index = SourceIndex.build(project_dir)
+        found_path = source_index.locate(class_full)
 
         if not found_path:
             print(f"No Java file found for {caller_method}")
@@ -68,13 +57,21 @@ def get_java_method_code(gateway, file_path, simple_class_name, method_name, par
         return None
 
 
-def locate_source_code(gateway,signature,file_path):
-    # gateway = JavaGateway()
+def get_java_methods_code(gateway, file_path, requests):
+    """
+    requests: [(simple_class_name, method_name, param_signature)] of one file,
+    the gateway parses the file once (and keeps it in its LRU) and returns the codes in request order
+    """
+    try:
+        lines = "\n".join("\t".join(request) for request in requests)
+        result = gateway.entry_point.extractMethodsFromFile(os.path.abspath(file_path), lines)
+        return result.split("\0")
+    except Exception as e:
+        logging.error("error:%s", e)
+        return [None] * len(requests)
 
-    fqcn, simple_class_name, method_name, param_signature = parse_method_signature(signature)
-    
-    method_code = get_java_method_code(gateway, file_path, simple_class_name, method_name, param_signature)
-    
+
+def check_method_code(signature, method_code):
     if method_code is None:
         logging.warning("failed (None): %s", signature)
         return None
@@ -88,14 +85,67 @@ def locate_source_code(gateway,signature,file_path):
     logging.info("success: %s", signature)
     return method_code
 
+
+def locate_source_code(gateway,signature,file_path):
+    # gateway = JavaGateway()
+
+    fqcn, simple_class_name, method_name, param_signature = parse_method_signature(signature)
+    
+    method_code = get_java_method_code(gateway, file_path, simple_class_name, method_name, param_signature)
+    return check_method_code(signature, method_code)
+
+
+def locate_source_codes(gateway, signatures_by_file, cache=None, workers=1):
+    """
+    signatures_by_file: file path -> signatures declared in it, one gateway call per file
+    cache: a MethodSourceCache, only signatures it does not know for the current file content go to the gateway
+    workers: files extracted concurrently, py4j serves every client connection on its own JVM thread
+    """
+    method_codes = {}
+    file_hashes = {}
+    pending = {}
+    for file_path, signatures in signatures_by_file.items():
+        if cache is not None:
+            try:
+                file_hashes[file_path] = cache.file_hash(file_path)
+                method_codes.update(cache.get_many(file_hashes[file_path], signatures))
+            except OSError as e:
+                logging.error("error:%s", e)
+        missing = [signature for signature in signatures if signature not in method_codes]
+        if missing:
+            pending[file_path] = missing
+
+    def extract(file_path):
+        requests = [parse_method_signature(signature)[1:] for signature in pending[file_path]]
+        return get_java_methods_code(gateway, file_path, requests)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = executor.map(extract, pending)
+        # the sqlite cache stays on this thread
+        for file_path, codes in zip(pending, results):
+            fetched = dict(zip(pending[file_path], codes))
+            method_codes.update(fetched)
+            if file_path in file_hashes:
+                # gateway and parse errors are not cached, they are retried next time
+                cache.put_many(file_hashes[file_path], {signature: code for signature, code in fetched.items()
+                                                        if code is not None and not code.startswith("ERROR:")})
+
+    source_codes = {}
+    for signatures in signatures_by_file.values():
+        for signature in signatures:
+            source_codes[signature] = check_method_code(signature, method_codes[signature])
+    return source_codes
+
 def load_package(config_file='mysql/config.ini'):
     config = configparser.ConfigParser()
     config.read(config_file)
     keywords = config.get('package', 'name', fallback='org.apache')
     return [kw.strip() for kw in keywords.split(',')] if keywords else []
 
-def process_log_file(input_file, project_dir,output_dir="output"):
+def process_log_file(input_file, project_dir,output_dir="output",source_index_file=None,method_cache_file=None,workers=1):
     gateway = JavaGateway()  # ✅ 只创建一次
+    cache = MethodSourceCache(method_cache_file or default_method_cache_path(project_dir))
+    source_index = SourceIndex.load_or_build(project_dir, source_index_file or default_source_index_path(project_dir))
     output_file=os.path.join(output_dir,"extracted_methods.json")
     missing_line_info_file=os.path.join(output_dir,"missing_methods.json")
 
@@ -123,9 +173,20 @@ def process_log_file(input_file, project_dir,output_dir="output"):
                 print(f"Failed to match line: {line.strip()}")
 
 
+    file_paths = {}
+    signatures_by_file = {}
+    for method_signature in method_signatures:
+        file_path = locate_source_code_file_path(method_signature,project_dir,source_index)
+        file_paths[method_signature] = file_path
+        if file_path:
+            signatures_by_file.setdefault(file_path, []).append(method_signature)
+    source_codes = locate_source_codes(gateway, signatures_by_file, cache, workers)
+    cache.close()
+    logging.info("%d signatures in %d files", len(file_paths), len(signatures_by_file))
+
     for method_signature in method_signatures:
-        file_path = locate_source_code_file_path(method_signature,project_dir)
-        source_code = locate_source_code(gateway,method_signature,file_path)
+        file_path = file_paths[method_signature]
+        source_code = source_codes.get(method_signature)
       
         if source_code:
             result_dict[method_signature] = {
@@ -236,6 +297,9 @@ def main():
     parser.add_argument('--call_chain_file', type=str, required=True,help="sub graph file")
     parser.add_argument('--project_dir', type=str, required=True,help="the root dir of project dir")
     parser.add_argument('--output_dir', type=str, required=True,help="output dir of mapping json")
+    parser.add_argument('--source_index', type=str, required=False,default=None,help="class -> .java path index, default output/<repo>/source_index.json, rebuilt when the tree changes")
+    parser.add_argument('--workers', type=int, required=False,default=1,help="files extracted concurrently through the gateway")
+    parser.add_argument('--method_cache', type=str, required=False,default=None,help="method sources keyed by signature and file hash, shared by all entries, default output/<repo>/method_sources.db")
     
     args = parser.parse_args()
 
@@ -243,7 +307,7 @@ def main():
     project_dir = args.project_dir
     output_dir = args.output_dir
 
-    process_log_file(input_file,project_dir,output_dir)
+    process_log_file(input_file,project_dir,output_dir,args.source_index,args.method_cache,args.workers)
     prune_call_chain_by_log_node(args.call_chain_file,args.call_chain_file)
     logging.info("Processing complete.")
 
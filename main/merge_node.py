@@ -4,8 +4,11 @@ import os
 import json
 import logging
 import argparse
-from models.prompts.merge_node_info import get_merge_nodes_by_llm_v4
-from models.get_resp import get_response
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from models.prompts.merge_node_info import get_merge_nodes_by_llm_v4, get_merge_siblings_by_llm, get_merge_nodes_by_llm_multi
+from models.get_resp import get_response_limited
+import tiktoken
 import xml.etree.ElementTree as ET
 
 logging.basicConfig(level=logging.DEBUG,
@@ -16,6 +19,16 @@ logging.basicConfig(level=logging.DEBUG,
                     ])
 logger = logging.getLogger()
 
+# prompts above the decoder's slice size (APIChatDecoder.codegen) are cut into several requests
+MAX_MERGE_PROMPT_TOKENS = 8000
+# LLM calls one node's pairwise reduction ("tree") keeps in flight, per merged node
+REDUCE_WORKERS = 4
+_encoding = tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text):
+    return len(_encoding.encode(text, disallowed_special=()))
+
 
 def address_log_seq(message):
 
@@ -46,8 +59,13 @@ def address_log_seq(message):
     return xml_data
 
 class StackDFSMerger:
-    def __init__(self, simple_call_graph, code_map,single_log_map):
+    def __init__(self, simple_call_graph, code_map,single_log_map,merge_strategy="fold",reduce_workers=REDUCE_WORKERS):
+        # merge_strategy: "fold" merges the children into the parent one after another,
+        # "tree" combines the children pairwise first (see _reduce_children) and merges the parent once
+        # "batch" merges the parent with all its children in as few prompts as fit (see _split_children)
         self.simple_call_graph = simple_call_graph
+        self.merge_strategy = merge_strategy
+        self.reduce_workers = reduce_workers
         self.code_map = code_map
         self.single_log_map = single_log_map
         self.processed = {}        
@@ -56,6 +74,8 @@ class StackDFSMerger:
         
         self.merged_info = {}       
         self.merged_logs = ""
+        self.llm_calls = {}         # node -> LLM calls spent merging it
+        self._calls_lock = threading.Lock()  # _call_llm runs on the merge and reduction threads
 
     def _is_leaf(self, node):
         return not bool(self.simple_call_graph.get(node))
@@ -104,6 +124,13 @@ class StackDFSMerger:
         self.merged_info[node]=parent_log
         address_log = address_log_seq(parent_log)
         self.single_log_map[node]=address_log
+
+        if self.merge_strategy == "tree":
+            self._merge_parent_tree(node, parent_code, parent_log)
+            return
+        if self.merge_strategy == "batch":
+            self._merge_parent_batch(node, parent_code, parent_log)
+            return
         
         for child in self.simple_call_graph[node]:
             child_code = self._get_node_code(child)
@@ -122,7 +149,7 @@ class StackDFSMerger:
             child_info ="node name is"+child+ "node log is"+str(child_log)+"source code:"+str(child_code)
             prompts = list(get_merge_nodes_by_llm_v4(parent_info,child_info))
             
-            merged = get_response(prompts)
+            merged = self._call_llm(node, prompts)
             self.merged_info[node]=merged
             addressed_merged = address_log_seq(merged)
             self.single_log_map[node] = addressed_merged
@@ -131,6 +158,104 @@ class StackDFSMerger:
             self.merged_logs = addressed_merged
             print(f"[MERGE] {node}merged {child} ")
             parent_log = addressed_merged
+        self._log_calls(node)
+
+    def _call_llm(self, node, prompts):
+        # merge_parallel and the tree reduction call this from several threads, every request goes through
+        # the one process-wide rate limiter (max_concurrency, requests/tokens per minute, 429 backoff)
+        with self._calls_lock:
+            self.llm_calls[node] = self.llm_calls.get(node, 0) + 1
+        return get_response_limited(prompts)
+
+    def _log_calls(self, node):
+        if node in self.llm_calls:
+            logger.info(f"[CALLS] {node}: {self.llm_calls[node]} LLM calls")
+
+    def _children_info(self, node):
+        children_info = []
+        for child in self.simple_call_graph[node]:
+            child_code = self._get_node_code(child)
+            child_log = self.single_log_map.get(child,"")
+            if not child_code or not child_log:
+                continue
+            child_log = address_log_seq(child_log)
+            children_info.append("node name is"+child+ "node log is"+str(child_log)+"source code:"+str(child_code))
+        return children_info
+
+    def _merge_parent_tree(self, node, parent_code, parent_log):
+        children_info = self._children_info(node)
+        if not children_info:
+            return
+
+        child_info = self._reduce_children(node, children_info)
+        parent_info = "node name is "+node+"node log is"+str(parent_log)+"souce code:"+ str(parent_code)
+        merged = self._call_llm(node, list(get_merge_nodes_by_llm_v4(parent_info,child_info)))
+        self.merged_info[node]=merged
+        addressed_merged = address_log_seq(merged)
+        self.single_log_map[node] = addressed_merged
+        self.merged_logs = addressed_merged
+        print(f"[MERGE] {node} merged {len(children_info)} children")
+        self._log_calls(node)
+
+    def _merge_parent_batch(self, node, parent_code, parent_log):
+        children_info = self._children_info(node)
+        if not children_info:
+            return
+        for group in self._split_children(node, parent_code, parent_log, children_info):
+            # later groups merge into the result of the earlier ones, like the fold
+            parent_info = "node name is "+node+"node log is"+str(parent_log)+"souce code:"+ str(parent_code)
+            merged = self._call_llm(node, list(get_merge_nodes_by_llm_multi(parent_info, group)))
+            self.merged_info[node]=merged
+            parent_log = address_log_seq(merged)
+            self.single_log_map[node] = parent_log
+            self.merged_logs = parent_log
+            print(f"[MERGE] {node} merged {len(group)} children")
+        self._log_calls(node)
+
+    def _split_children(self, node, parent_code, parent_log, children_info, max_tokens=MAX_MERGE_PROMPT_TOKENS):
+        """
+        children in call order, cut into consecutive groups whose multi-child prompt stays within max_tokens;
+        filling every group greedily gives the fewest groups for an order preserving split,
+        a child too large on its own gets a group of its own
+        """
+        parent_info = "node name is "+node+"node log is"+str(parent_log)+"souce code:"+ str(parent_code)
+        base_tokens = count_tokens(next(get_merge_nodes_by_llm_multi(parent_info, [])))
+        groups = []
+        group, group_tokens = [], base_tokens
+        for child_info in children_info:
+            child_tokens = count_tokens(child_info) + 8
+            if group and group_tokens + child_tokens > max_tokens:
+                groups.append(group)
+                group, group_tokens = [], base_tokens
+            group.append(child_info)
+            group_tokens += child_tokens
+        groups.append(group)
+        if len(groups) > 1:
+            logger.info(f"{node}: {len(children_info)} children split into {len(groups)} prompts")
+        return groups
+
+    def _reduce_children(self, node, children_info):
+        """
+        balanced reduction: neighbours in call order are combined pairwise, the pairs of one round in parallel
+        on at most reduce_workers threads,
+        until one callee summary is left, so k children cost about log2(k) dependent LLM calls;
+        a combined summary keeps only the combined paths, not the sources, which bounds the prompt size
+        """
+        round_number = 0
+        while len(children_info) > 1:
+            round_number += 1
+            pairs = [children_info[i:i + 2] for i in range(0, len(children_info), 2)]
+
+            def combine(pair):
+                if len(pair) == 1:
+                    return pair[0]
+                reply = self._call_llm(node, list(get_merge_siblings_by_llm(pair[0], pair[1])))
+                return "combined callees node log is"+str(address_log_seq(reply))
+
+            with ThreadPoolExecutor(max_workers=min(len(pairs), self.reduce_workers)) as executor:
+                children_info = list(executor.map(combine, pairs))
+            logger.debug(f"reduction round {round_number}: {len(children_info)} summaries left")
+        return children_info[0]
 
     def _get_pending_children(self, node):
         return [n for n in self.simple_call_graph.get(node, []) 
@@ -197,6 +322,94 @@ class StackDFSMerger:
                     self.processed[current] = True
                     self.pop()
 
+    def _condense(self, entry_points):
+        """
+        strongly connected components of the graph reachable from entry_points (Tarjan, iterative,
+        children in call order), returned children first: every component comes after the ones it calls into
+        """
+        index = {}
+        lowlink = {}
+        on_stack = set()
+        scc_stack = []
+        components = []
+        for root in entry_points:
+            if root in index:
+                continue
+            index[root] = lowlink[root] = len(index)
+            scc_stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.simple_call_graph.get(root, [])))]
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if child not in index:
+                        index[child] = lowlink[child] = len(index)
+                        scc_stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self.simple_call_graph.get(child, []))))
+                        break
+                    if child in on_stack:
+                        lowlink[node] = min(lowlink[node], index[child])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+                    if lowlink[node] == index[node]:
+                        component = []
+                        while True:
+                            member = scc_stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(component)
+        return components
+
+    def _merge_component(self, component):
+        # members of a cycle are merged one after another, deepest discovered first, like the forced
+        # cycle break of merge(); a single node is a leaf or a parent whose callees are all finished
+        for node in component:
+            if self._is_leaf(node):
+                self._process_leaf(node)
+            else:
+                self._merge_parent(node)
+            self.processed[node] = True
+
+    def merge_parallel(self, entry_points, workers=4):
+        """
+        merge() with independent subtrees merged concurrently: the graph is condensed into its
+        strongly connected components and every component whose callees are finished is handed to
+        the pool, so the wall time follows the longest call chain instead of the number of nodes.
+        A node still merges its children one by one in call order, after all of them are finished.
+        However many workers (and reduce_workers) run, the LLM requests in flight are capped by the shared
+        limiter of get_response_limited.
+        """
+        components = self._condense(list(entry_points))
+        component_of = {node: i for i, component in enumerate(components) for node in component}
+        waiting_on = [0] * len(components)
+        callers = [set() for _ in components]
+        for i, component in enumerate(components):
+            callees = {component_of[child] for node in component
+                       for child in self.simple_call_graph.get(node, [])} - {i}
+            waiting_on[i] = len(callees)
+            for callee in callees:
+                callers[callee].add(i)
+        logger.info(f"{len(component_of)} nodes, {len(components)} components, {workers} workers")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            running = {executor.submit(self._merge_component, components[i]): i
+                       for i in range(len(components)) if waiting_on[i] == 0}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    future.result()
+                    for caller in sorted(callers[i]):
+                        waiting_on[caller] -= 1
+                        if waiting_on[caller] == 0:
+                            running[executor.submit(self._merge_component, components[caller])] = caller
+
 def load_json(json_file):
     try:
         with open(json_file, 'r', encoding='utf-8') as file:
@@ -284,6 +497,9 @@ def main():
     parser.add_argument('--source_mapping', type=str, required=True,help="source_code mapping file path")
     parser.add_argument('--single_call_path', type=str, required=True,help="single log generation mapping file path")
     parser.add_argument('--output_dir', type=str, required=True,help="output dir of mapping json")
+    parser.add_argument('--workers', type=int, required=False,default=1,help="nodes merged concurrently once their callees are merged, 1 keeps the sequential stack merge")
+    parser.add_argument('--reduce_workers', type=int, required=False,default=REDUCE_WORKERS,help="tree strategy: LLM calls one node's pairwise reduction runs concurrently")
+    parser.add_argument('--merge_strategy', choices=['fold', 'tree', 'batch'], default='fold', help="fold: merge the children into the parent one by one; tree: combine the children pairwise in parallel, then merge the parent once; batch: merge the parent with all its children in as few prompts as fit")
     
     args = parser.parse_args()
 
@@ -307,8 +523,11 @@ def main():
         print(f"load {single_call_path} failed")
 
     
-    merger = StackDFSMerger(simple_call_graph, code_map,single_log_map)
-    merger.merge(roots)
+    merger = StackDFSMerger(simple_call_graph, code_map,single_log_map,args.merge_strategy,args.reduce_workers)
+    if args.workers > 1:
+        merger.merge_parallel(roots, args.workers)
+    else:
+        merger.merge(roots)
     
     single_log_seq_json = merger.merged_info
     single_log_info_json = merger.single_log_map
@@ -323,6 +542,7 @@ def main():
     with open(single_log_seq, "w", encoding="utf-8") as f:
         json.dump(single_log_seq_json, f, indent=2, ensure_ascii=False)
     print(merged_logs)
+    logger.info(f"{sum(merger.llm_calls.values())} LLM calls for {len(merger.llm_calls)} merged nodes")
     print(f"merge all")
 
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+import os
+import hashlib
+import sqlite3
+import logging
+
+
+class MethodSourceCache:
+    """
+    project wide method sources keyed by (signature, sha1 of the declaring .java file), shared by every entry
+        - method_source: what the gateway returned for the signature in that file content, '' if it is not declared there
+        - file_hash: path, mtime and size -> sha1, so unchanged files are not even read again
+    """
+
+    def __init__(self, path):
+        cache_dir = os.path.dirname(path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.cnx = sqlite3.connect(path)
+        self.cnx.execute("PRAGMA journal_mode=WAL")
+        self.cnx.execute("""CREATE TABLE IF NOT EXISTS method_source (
+            signature TEXT, file_hash TEXT, source_code TEXT, PRIMARY KEY (signature, file_hash))""")
+        self.cnx.execute("""CREATE TABLE IF NOT EXISTS file_hash (
+            path TEXT PRIMARY KEY, mtime REAL, size INTEGER, hash TEXT)""")
+        self.hits = 0
+        self.misses = 0
+
+    def file_hash(self, file_path):
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        row = self.cnx.execute("SELECT hash FROM file_hash WHERE path = ? AND mtime = ? AND size = ?",
+                               (file_path, stat.st_mtime, stat.st_size)).fetchone()
+        if row:
+            return row[0]
+        with open(file_path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self.cnx.execute("INSERT OR REPLACE INTO file_hash VALUES (?, ?, ?, ?)",
+                         (file_path, stat.st_mtime, stat.st_size, digest))
+        self.cnx.commit()
+        return digest
+
+    def get_many(self, file_hash, signatures):
+        """signature -> cached source code for the ones known under file_hash"""
+        found = {}
+        for signature in signatures:
+            row = self.cnx.execute("SELECT source_code FROM method_source WHERE signature = ? AND file_hash = ?",
+                                   (signature, file_hash)).fetchone()
+            if row is not None:
+                found[signature] = row[0]
+        self.hits += len(found)
+        self.misses += len(signatures) - len(found)
+        return found
+
+    def put_many(self, file_hash, source_codes):
+        self.cnx.executemany("INSERT OR REPLACE INTO method_source VALUES (?, ?, ?)",
+                             [(signature, file_hash, code) for signature, code in source_codes.items()])
+        self.cnx.commit()
+
+    def close(self):
+        logging.info(f"Method source cache: {self.hits} hits, {self.misses} misses")
+        self.cnx.close()
+
+
+def default_method_cache_path(project_dir):
+    repo_name = os.path.basename(project_dir.rstrip('/'))
+    return os.path.join("output", repo_name, "method_sources.db")
@@ -4,27 +4,15 @@ import argparse
 import time
 import configparser
 import re
-import mysql.connector
 import logging
+from array import array
 from collections import deque
+from call_graph_index import CallGraphIndex, default_index_path
+from db_access import open_store, log_query_stats, MAX_IN_PARAMS
+from callee_memo import default_memo_path
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-def load_db_config(config_file='mysql/config.ini'):
-    config = configparser.ConfigParser()
-    if not os.path.exists(config_file):
-        raise FileNotFoundError(f"Config file {config_file} not found.")
-    config.read(config_file)
-    db_conf = {
-        'host': config.get('mysql', 'host'),
-        'port': config.getint('mysql', 'port'),
-        'user': config.get('mysql', 'user'),
-        'password': config.get('mysql', 'password'),
-        'database': config.get('mysql', 'database'),
-        'charset': 'utf8mb4'
-    }
-    return db_conf
-
 def get_int(value):
     try:
         return int(value)
@@ -37,41 +25,13 @@ def process_callee(callee_field):
 
 
 
-def ensure_table_and_column(db_config):
+def ensure_table_and_column(db):
     """make sure table and column all exist"""
     try:
-        cnx = mysql.connector.connect(**db_config)
-        cursor = cnx.cursor()
-        # check and create table if not exists
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS `method_call` (
-              `id` int NOT NULL AUTO_INCREMENT,
-              `call_seq` int DEFAULT NULL,
-              `enabled` tinyint DEFAULT NULL,
-              `caller` text,
-              `callee` text,
-              `call_line_no` int DEFAULT NULL,
-              `call_return_type` text,
-              `log_propagation` tinyint DEFAULT '0',
-              PRIMARY KEY (`id`),
-              INDEX `caller_idx` (`caller`(255)),
-              INDEX `callee_idx` (`callee`(255))
-            ) ENGINE=InnoDB;
-        """)
-
-        cursor.execute("SHOW COLUMNS FROM method_call LIKE 'log_propagation'")
-        if not cursor.fetchone():
-            logging.info("con 'log_propagation' not existing,adding...")
-            cursor.execute("ALTER TABLE method_call ADD COLUMN log_propagation TINYINT DEFAULT 0")
-            logging.info("列 'log_propagation' add finished!")
-    
         logging.info("Clearing method_call Table...")
-        cursor.execute("TRUNCATE TABLE method_call")
-        cnx.commit()
-        cursor.close()
-        cnx.close()
+        db.reset_method_call_table()
         logging.info("Database prepared successfully.")
-    except mysql.connector.Error as err:
+    except db.Error as err:
         logging.error(f"Database prepared failed: {err}")
         sys.exit(1)
 
@@ -86,6 +46,9 @@ def load_logging_keywords(config_file='mysql/config.ini'):
 def save_start_nodes(marked, reverse_graph,output_file="output/start_node.txt"):
 
     start_nodes = [node for node in marked if node not in reverse_graph or len(reverse_graph[node]) == 0]
+    write_start_nodes(start_nodes, output_file)
+
+def write_start_nodes(start_nodes, output_file):
     try:
         with open(output_file, "w", encoding="utf-8") as f:
             for node in start_nodes:
@@ -95,22 +58,10 @@ def save_start_nodes(marked, reverse_graph,output_file="output/start_node.txt"):
         logging.error(f"write to 0 egde is failed: {e}")
 
 
-## change: load config from file to memory instead of connect to db multiple times
-def load_graph_from_file(input_file):
+def stream_method_call_rows(input_file):
     """
-    input: method_call.txt 
-    return 
-        - forward_graph: indirect {caller: {callee1, callee2}}
-        - reverse_graph: redirect {callee: {caller1, caller2}}
-        - nodes: the set of all nodes
-        - all_rows: list of all rows for later bulk insert
+    yield (call_seq, enabled, caller, callee, call_line_no, call_return_type) per line of method_call.txt
     """
-    logging.info(f"Starting from {input_file} loading graph to memory...")
-    forward_graph = {}
-    reverse_graph = {}
-    nodes = set()
-    all_rows = []
-
     with open(input_file, "r", encoding="utf-8") as f:
         for line in f:
             if not line.strip():
@@ -120,26 +71,51 @@ def load_graph_from_file(input_file):
             if len(cols) < 6:
                 continue
 
-            caller = cols[2]
-            callee = process_callee(cols[3])
-
-            # store row data
-            row_data = (
+            yield (
                 get_int(cols[0]),
                 get_int(cols[1]),
-                caller,
-                callee,
+                cols[2],
+                process_callee(cols[3]),
                 get_int(cols[4]),
                 cols[5]
             )
-            all_rows.append(row_data)
 
-            # if enabled=1，add it to graph
-            if get_int(cols[1]) == 1:
-                nodes.add(caller)
-                nodes.add(callee)
-                forward_graph.setdefault(caller, set()).add(callee)
-                reverse_graph.setdefault(callee, set()).add(caller)
+def chunked(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+## change: load config from file to memory instead of connect to db multiple times
+def load_graph_from_file(input_file):
+    """
+    input: method_call.txt 
+    return 
+        - forward_graph: indirect {caller: {callee1, callee2}}
+        - reverse_graph: redirect {callee: {caller1, caller2}}
+        - nodes: the set of all nodes
+        - all_rows: list of all rows for later bulk insert
+    """
+    logging.info(f"Starting from {input_file} loading graph to memory...")
+    forward_graph = {}
+    reverse_graph = {}
+    nodes = set()
+    all_rows = []
+
+    for row_data in stream_method_call_rows(input_file):
+        all_rows.append(row_data)
+        caller, callee = row_data[2], row_data[3]
+
+        # if enabled=1，add it to graph
+        if row_data[1] == 1:
+            nodes.add(caller)
+            nodes.add(callee)
+            forward_graph.setdefault(caller, set()).add(callee)
+            reverse_graph.setdefault(callee, set()).add(caller)
 
     logging.info(f"Load graph finished.Nodes: {len(nodes)}, the number of relations: {len(all_rows)}")
     return forward_graph, reverse_graph, nodes, all_rows
@@ -168,7 +144,7 @@ def run_bfs_in_memory(reverse_graph, start_nodes):
     return marked
 
 
-def bulk_insert_to_db(db_config, all_rows, marked_nodes):
+def bulk_insert_to_db(db, all_rows, marked_nodes):
     """
     use executemany batch insert into database
     """
@@ -185,43 +161,256 @@ def bulk_insert_to_db(db_config, all_rows, marked_nodes):
         return
 
     try:
-        cnx = mysql.connector.connect(**db_config)
-        cursor = cnx.cursor()
-        
-        insert_sql = (
-            "INSERT INTO method_call "
-            "(call_seq, enabled, caller, callee, call_line_no, call_return_type, log_propagation) "
-            "VALUES (%s, %s, %s, %s, %s, %s, %s)"
-        )
-        
         # make sure batch size is not too large
         batch_size = 50000
         total_inserted = 0
+        start_time = time.time()
         
         logging.info(f"All {len(data_to_insert)} records to insert, and each batch {batch_size}.")
 
         for i in range(0, len(data_to_insert), batch_size):
             batch = data_to_insert[i:i + batch_size]
-            cursor.executemany(insert_sql, batch)
-            cnx.commit() 
+            db.insert_rows(batch)
             total_inserted += len(batch)
             logging.info(f"Successfully insert {total_inserted} / {len(data_to_insert)} records...")
         
         logging.info(f"All records inserted successfully. Total: {total_inserted}")
-        
-        cursor.close()
-        cnx.close()
-    except mysql.connector.Error as err:
+        logging.info(f"[timing] executemany insert: {time.time() - start_time:.2f} seconds")
+    except db.Error as err:
         logging.error(f"Error when inserting to database {err}")
 
 
 
 
+def insert_chunks_to_db(db, chunks):
+    """
+    pass-through stage of the streaming pipeline: insert every chunk of 7-column rows and yield it on
+    """
+    total_inserted = 0
+    start_time = time.time()
+    for chunk in chunks:
+        db.insert_rows(chunk)
+        total_inserted += len(chunk)
+        elapsed = time.time() - start_time
+        logging.info(f"Inserted {total_inserted} records, {total_inserted / max(elapsed, 1e-9):.0f} rows/sec")
+        yield chunk
+
+def update_log_propagation_in_db(db, marked_callers, batch_size=MAX_IN_PARAMS):
+    updated = 0
+    for batch in chunked(marked_callers, batch_size):
+        db.mark_callers(batch)
+        updated += len(batch)
+    logging.info(f"log_propagation set for {updated} callers")
+
+def _tsv_field(value):
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+def write_chunks_to_tsv(tsv_file, chunks):
+    """
+    pass-through stage of the streaming pipeline: append every chunk of 7-column rows to a LOAD DATA file
+    """
+    start_time = time.time()
+    total = 0
+    with open(tsv_file, "w", encoding="utf-8", newline="\n") as f:
+        for chunk in chunks:
+            f.writelines("\t".join(_tsv_field(v) for v in row) + "\n" for row in chunk)
+            total += len(chunk)
+            yield chunk
+    logging.info(f"[timing] write tsv ({total} rows): {time.time() - start_time:.2f} seconds")
+
+def load_tsv_to_db(db, tsv_file, keep_tsv=False):
+    """
+    fast path for bulk_insert_to_db:
+        LOAD DATA LOCAL INFILE into a staging table without secondary indexes,
+        build caller_idx/callee_idx afterwards, then swap it in for method_call with one RENAME
+    mysql only, the server needs local_infile=1 and db opened with allow_local_infile=True
+    """
+    # the path is a quoted SQL string literal
+    tsv_path = os.path.abspath(tsv_file).replace("\\", "\\\\").replace("'", "\\'")
+    phases = [
+        ("create staging table", [
+            "DROP TABLE IF EXISTS method_call_staging",
+            "DROP TABLE IF EXISTS method_call_old",
+            """CREATE TABLE method_call_staging (
+              `id` int NOT NULL AUTO_INCREMENT,
+              `call_seq` int DEFAULT NULL,
+              `enabled` tinyint DEFAULT NULL,
+              `caller` text,
+              `callee` text,
+              `call_line_no` int DEFAULT NULL,
+              `call_return_type` text,
+              `log_propagation` tinyint DEFAULT '0',
+              PRIMARY KEY (`id`)
+            ) ENGINE=InnoDB""",
+        ]),
+        ("load data", [
+            f"""LOAD DATA LOCAL INFILE '{tsv_path}' INTO TABLE method_call_staging
+              CHARACTER SET utf8mb4
+              FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+              LINES TERMINATED BY '\\n'
+              (call_seq, enabled, caller, callee, call_line_no, call_return_type, log_propagation)""",
+        ]),
+        ("build indexes", [
+            "ALTER TABLE method_call_staging ADD INDEX `caller_idx` (`caller`(255)), ADD INDEX `callee_idx` (`callee`(255))",
+        ]),
+        ("swap tables", [
+            "RENAME TABLE method_call TO method_call_old, method_call_staging TO method_call",
+            "DROP TABLE method_call_old",
+        ]),
+    ]
+    try:
+        for name, statements in phases:
+            phase_start = time.time()
+            for sql in statements:
+                db.execute(sql)
+            db.commit()
+            logging.info(f"[timing] {name}: {time.time() - phase_start:.2f} seconds")
+    except db.Error as err:
+        logging.error(f"Error when loading {tsv_file} into database (is local_infile enabled on the server?): {err}")
+        sys.exit(1)
+    if not keep_tsv:
+        os.remove(tsv_file)
+
+def db_sink(db, chunks, load_mode, tsv_file):
+    if load_mode == "load_data":
+        return write_chunks_to_tsv(tsv_file, chunks)
+    return insert_chunks_to_db(db, chunks)
+
+def streaming_store(method_call_file, db, logging_keywords, graph_index_file, start_nodes_output_file, chunk_size,
+                    load_mode="insert", tsv_file=None):
+    """
+    low-memory variant of main: rows flow file -> db -> graph index in chunks of chunk_size,
+    only the interned signatures stay in memory
+    """
+    rows = (row + (0,) for row in stream_method_call_rows(method_call_file))
+    chunks = db_sink(db, chunked(rows, chunk_size), load_mode, tsv_file)
+    graph = CallGraphIndex.build_streaming(chunks, graph_index_file, writable=True)
+    if load_mode == "load_data":
+        load_tsv_to_db(db, tsv_file)
+
+    start_ids = [node for node, sig in enumerate(graph.signatures)
+                 if any(kw in sig for kw in logging_keywords) and graph.touches_enabled_edge(node)]
+    logging.info(f"Go run BFS over the graph index,the numben of start node: {len(start_ids)}")
+    marked = graph.reverse_reachable(start_ids)
+    graph.set_log_propagation(marked)
+    logging.info(f"BFS Fininsed.All mark{sum(marked)} nodes")
+
+    marked_callers = (graph.signatures[node] for node in range(graph.num_nodes) if marked[node])
+    update_log_propagation_in_db(db, marked_callers)
+
+    start_nodes = []
+    for node in range(graph.num_nodes):
+        if not marked[node]:
+            continue
+        if not any(graph.enabled[graph.rev_edges[i]] for i in range(graph.rev_offsets[node], graph.rev_offsets[node + 1])):
+            start_nodes.append(graph.signatures[node])
+    write_start_nodes(start_nodes, start_nodes_output_file)
+
+def build_reverse_adjacency(input_file, logging_keywords):
+    """
+    pass one of the two-pass mode: intern signatures to ints and keep only the enabled reverse edges
+    return
+        - ids: {signature: id}
+        - rev_offsets/rev_preds: callee id -> caller ids, CSR layout
+        - start_ids: ids of nodes matching the logging keywords
+    """
+    ids = {}
+    src = array('i')
+    dst = array('i')
+    start_ids = []
+
+    def intern(sig):
+        node_id = ids.get(sig)
+        if node_id is None:
+            node_id = len(ids)
+            ids[sig] = node_id
+        return node_id
+
+    enabled_nodes = bytearray()
+    for row in stream_method_call_rows(input_file):
+        s, d = intern(row[2]), intern(row[3])
+        if len(enabled_nodes) < len(ids):
+            enabled_nodes.extend(bytes(len(ids) - len(enabled_nodes)))
+        if row[1] == 1:
+            src.append(s)
+            dst.append(d)
+            enabled_nodes[s] = enabled_nodes[d] = 1
+
+    for sig, node_id in ids.items():
+        if enabled_nodes[node_id] and any(kw in sig for kw in logging_keywords):
+            start_ids.append(node_id)
+
+    num_nodes = len(ids)
+    rev_offsets = array('q', [0]) * (num_nodes + 1)
+    for d in dst:
+        rev_offsets[d + 1] += 1
+    for i in range(num_nodes):
+        rev_offsets[i + 1] += rev_offsets[i]
+    rev_preds = array('i', [0]) * len(src)
+    cursor = array('q', rev_offsets[:num_nodes])
+    for s, d in zip(src, dst):
+        rev_preds[cursor[d]] = s
+        cursor[d] += 1
+
+    logging.info(f"Pass one finished. Nodes: {num_nodes}, enabled edges: {len(src)}")
+    return ids, rev_offsets, rev_preds, start_ids
+
+def mark_reachable(rev_offsets, rev_preds, start_ids):
+    """same BFS as run_bfs_in_memory, over int ids, the marked set is a bitmap"""
+    marked = bytearray(len(rev_offsets) - 1)
+    queue = deque()
+    for node in start_ids:
+        if not marked[node]:
+            marked[node] = 1
+            queue.append(node)
+    while queue:
+        current = queue.popleft()
+        for i in range(rev_offsets[current], rev_offsets[current + 1]):
+            pred = rev_preds[i]
+            if not marked[pred]:
+                marked[pred] = 1
+                queue.append(pred)
+    logging.info(f"BFS Fininsed.All mark{sum(marked)} nodes")
+    return marked
+
+def iter_flagged_rows(input_file, ids, marked):
+    """pass two of the two-pass mode: re-read method_call.txt and append the log_propagation flag"""
+    for row in stream_method_call_rows(input_file):
+        yield row + (marked[ids[row[2]]],)
+
+def two_pass_store(method_call_file, db, logging_keywords, graph_index_file, start_nodes_output_file, chunk_size,
+                   load_mode="insert", tsv_file=None):
+    """
+    mark first, then write: rows are inserted once with their final log_propagation value,
+    memory is the interned ids, the enabled reverse adjacency and a bitmap
+    """
+    ids, rev_offsets, rev_preds, start_ids = build_reverse_adjacency(method_call_file, logging_keywords)
+    marked = mark_reachable(rev_offsets, rev_preds, start_ids)
+
+    start_nodes = [sig for sig, node_id in ids.items()
+                   if marked[node_id] and rev_offsets[node_id + 1] == rev_offsets[node_id]]
+    write_start_nodes(start_nodes, start_nodes_output_file)
+    rev_offsets = rev_preds = None
+
+    rows = iter_flagged_rows(method_call_file, ids, marked)
+    chunks = db_sink(db, chunked(rows, chunk_size), load_mode, tsv_file)
+    CallGraphIndex.build_streaming(chunks, graph_index_file)
+    if load_mode == "load_data":
+        load_tsv_to_db(db, tsv_file)
+
 def main():
     parser = argparse.ArgumentParser(description="Address Java Call graph and prune it using BFS in memory")
     parser.add_argument('--project_dir', type=str, required=True, help="input project dir")
     parser.add_argument('--input_dir', type=str, required=True, help="javacallgraph output dir(including  method_call.txt)")
     parser.add_argument('--config_file', type=str, default='mysql/config.ini', help="data db config file")
+    parser.add_argument('--graph_index', type=str, default=None, help="where to save the call graph index, default <input_dir>/call_graph.idx")
+    parser.add_argument('--streaming', action='store_true', help="stream method_call.txt in chunks instead of loading it into memory")
+    parser.add_argument('--two_pass', action='store_true', help="mark log_propagation in a first pass over method_call.txt, write flagged rows in a second pass")
+    parser.add_argument('--chunk_size', type=int, default=50000, help="rows per chunk in streaming and two-pass mode")
+    parser.add_argument('--load_mode', choices=['insert', 'load_data'], default='insert', help="insert: executemany batches; load_data: LOAD DATA LOCAL INFILE into a staging table, index and swap")
     args = parser.parse_args()
 
     start_time = time.time()
@@ -236,12 +425,33 @@ def main():
         logging.error(f"Input file not exist : {method_call_file} ")
         sys.exit(1)
 
-    # 1. load config and logging keywords
-    db_config = load_db_config(args.config_file)
+    # 1. open the method_call store and load logging keywords
+    if args.load_mode == "load_data":
+        db = open_store(args.config_file, allow_local_infile=True)
+        if db.backend != "mysql":
+            logging.error(f"--load_mode load_data needs the mysql backend, configured backend is {db.backend}")
+            sys.exit(1)
+    else:
+        db = open_store(args.config_file)
     logging_keywords = load_logging_keywords(args.config_file)
     
-    # 2. prepare db table and column
-    ensure_table_and_column(db_config)
+    # 2. prepare db table and column, callee lists memoized from the previous table are stale now
+    ensure_table_and_column(db)
+    memo_file = default_memo_path(output_dir)
+    if os.path.exists(memo_file):
+        os.remove(memo_file)
+
+    graph_index_file = args.graph_index or default_index_path(args.input_dir)
+    start_nodes_output_file = os.path.join(output_dir, 'start_nodes.txt')
+    tsv_file = os.path.join(output_dir, 'method_call_load.tsv')
+    if args.streaming or args.two_pass:
+        store = two_pass_store if args.two_pass else streaming_store
+        store(method_call_file, db, logging_keywords, graph_index_file,
+              start_nodes_output_file, args.chunk_size, args.load_mode, tsv_file)
+        db.close()
+        log_query_stats()
+        logging.info(f"All task finished! All use time: {time.time() - start_time:.2f} seconds")
+        return
 
     # 3. load to memory
     forward_graph, reverse_graph, nodes, all_rows = load_graph_from_file(method_call_file)
@@ -253,10 +463,20 @@ def main():
     marked_nodes = run_bfs_in_memory(reverse_graph, start_bfs_nodes)
     
     # 6. save to db
-    bulk_insert_to_db(db_config, all_rows, marked_nodes)
+    if args.load_mode == "load_data":
+        flagged_rows = (row + (1 if row[2] in marked_nodes else 0,) for row in all_rows)
+        for _ in write_chunks_to_tsv(tsv_file, chunked(flagged_rows, args.chunk_size)):
+            pass
+        load_tsv_to_db(db, tsv_file)
+    else:
+        bulk_insert_to_db(db, all_rows, marked_nodes)
+    db.close()
+    log_query_stats()
     
-    # 7. save the start nodes to file
-    start_nodes_output_file = os.path.join(output_dir, 'start_nodes.txt')
+    # 7. build the call graph index shared by the later stages
+    CallGraphIndex.from_rows(all_rows, marked_nodes).save(graph_index_file)
+
+    # 8. save the start nodes to file
     save_start_nodes(marked_nodes, reverse_graph, start_nodes_output_file)
 
     end_time = time.time()
@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import logging
+
+
+class SourceIndex:
+    """
+    .java file name -> paths under project_dir in os.walk order, built by one walk of the tree
+    persisted as json with the mtime of every directory, a directory that changed (file added, removed
+    or renamed) or disappeared invalidates the whole index
+    """
+
+    def __init__(self, project_dir, files_by_name, dir_mtimes):
+        self.project_dir = project_dir
+        self.files_by_name = files_by_name
+        self.dir_mtimes = dir_mtimes
+        self._located = {}
+
+    @classmethod
+    def build(cls, project_dir):
+        start_time = time.time()
+        files_by_name = {}
+        dir_mtimes = {}
+        for root, dirs, files in os.walk(project_dir):
+            dir_mtimes[root] = os.stat(root).st_mtime
+            for name in files:
+                if name.endswith(".java"):
+                    files_by_name.setdefault(name, []).append(os.path.join(root, name))
+        logging.info(f"Source index of {project_dir}: {len(files_by_name)} file names, "
+                     f"{len(dir_mtimes)} dirs, {time.time() - start_time:.2f} seconds")
+        return cls(project_dir, files_by_name, dir_mtimes)
+
+    def is_fresh(self):
+        for root, mtime in self.dir_mtimes.items():
+            try:
+                if os.stat(root).st_mtime != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def save(self, index_file):
+        index_dir = os.path.dirname(index_file)
+        if index_dir and not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+        tmp_file = index_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"project_dir": os.path.abspath(self.project_dir),
+                       "dir_mtimes": self.dir_mtimes,
+                       "files_by_name": self.files_by_name}, f)
+        os.replace(tmp_file, index_file)
+
+    @classmethod
+    def load_or_build(cls, project_dir, index_file):
+        if os.path.exists(index_file):
+            try:
+                with open(index_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data["project_dir"] == os.path.abspath(project_dir):
+                    index = cls(project_dir, data["files_by_name"], data["dir_mtimes"])
+                    if index.is_fresh():
+                        return index
+                logging.info(f"Source index {index_file} is stale, rebuilding")
+            except (ValueError, KeyError) as e:
+                logging.warning(f"Source index {index_file} unreadable, rebuilding: {e}")
+        index = cls.build(project_dir)
+        index.save(index_file)
+        return index
+
+    def locate(self, class_full):
+        """
+        path of the .java file declaring class_full (nested classes live in the outer class file):
+        the first file of that name whose path contains every package segment, else the first of that name
+        """
+        outer_class = class_full.split("$")[0]
+        if outer_class in self._located:
+            return self._located[outer_class]
+        candidate_filename = outer_class.split(".")[-1] + ".java"
+        package_dirs = class_full.split(".")[:-1]
+        found_path = None
+        for candidate_path in self.files_by_name.get(candidate_filename, ()):
+            if sum(1 for pkg in package_dirs if pkg in candidate_path) >= len(package_dirs):
+                found_path = candidate_path
+                break
+            if not found_path:
+                found_path = candidate_path
+        self._located[outer_class] = found_path
+        return found_path
+
+
+def default_source_index_path(project_dir):
+    repo_name = os.path.basename(project_dir.rstrip('/'))
+    return os.path.join("output", repo_name, "source_index.json")
@@ -3,7 +3,27 @@ from abc import ABC, abstractmethod
 from typing import List, Dict, Optional
 import tiktoken
 import time
-from openai import OpenAI, APIError  # import OpenAI client and special type
+import asyncio
+from openai import (OpenAI, AsyncOpenAI, APIError, RateLimitError,
+                    APIConnectionError, InternalServerError)  # import OpenAI client and special type
+from models.rate_limiter import AsyncRateLimiter
+
+
+def num_tokens_from_string(string: str, encoding) -> int:
+    num_tokens = len(encoding.encode(string))
+    return num_tokens
+
+def slice_message(message: str, max_tokens: int, encoding) -> List[str]:
+    if not isinstance(message, str):
+        message = str(message)
+    tokens = encoding.encode(message)
+    slices = []
+    start = 0
+    while start < len(tokens):
+        end = min(start + max_tokens, len(tokens))
+        slices.append(encoding.decode(tokens[start:end]))
+        start = end
+    return slices
 
 class DecoderBase(ABC):
     def __init__(self, name: str, logger, temperature: float, max_tokens: int):
@@ -41,23 +61,6 @@ class APIChatDecoder(DecoderBase):
             return tiktoken.get_encoding("cl100k_base")
 
     def codegen(self, message: str, num_samples: int = 1) -> List[Dict]:
-        # 内部辅助函数保持不变，因为它们不依赖于 API 版本
-        def num_tokens_from_string(string: str, encoding) -> int:
-            num_tokens = len(encoding.encode(string))
-            return num_tokens
-
-        def slice_message(message: str, max_tokens: int, encoding) -> List[str]:
-            if not isinstance(message, str):
-                message = str(message)
-            tokens = encoding.encode(message)
-            slices = []
-            start = 0
-            while start < len(tokens):
-                end = min(start + max_tokens, len(tokens))
-                slices.append(encoding.decode(tokens[start:end]))
-                start = end
-            return slices
-
         # 2. **更新 `compress_memory` 中的 API 调用**
         def compress_memory(memory: str, encoding):
             summary_config = {
@@ -154,6 +157,110 @@ class APIChatDecoder(DecoderBase):
         return False
 
 
+class AsyncAPIChatDecoder(APIChatDecoder):
+    """
+    APIChatDecoder 的 asyncio 版本：codegen 为协程，切片/记忆逻辑相同。
+    每次 API 调用先经过 limiter（并发数、requests/min、tokens/min），
+    429 由 limiter 统一退避后重试；连接错误、超时和 5xx 只让当前请求按同样的指数退避重试，
+    两者合计最多 max_retries 次；客户端自身不再重试。
+    """
+    def __init__(self, client: AsyncOpenAI, name: str, logger, temperature: float, max_tokens: int,
+                 limiter: AsyncRateLimiter, max_retries: int = 3):
+        super().__init__(client=client, name=name, logger=logger, temperature=temperature, max_tokens=max_tokens)
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    async def _create(self, config: dict, prompt_tokens: int):
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(prompt_tokens)
+            completion_tokens = 0
+            delay = 0.0
+            try:
+                response = await self.client.chat.completions.create(**config)
+                if response.usage:
+                    completion_tokens = response.usage.completion_tokens
+                self.limiter.on_success()
+                return response
+            except RateLimitError as e:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+                try:
+                    retry_after = float(retry_after) if retry_after else None
+                except ValueError:
+                    retry_after = None
+                self.limiter.on_rate_limited(retry_after)
+            except (APIConnectionError, InternalServerError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(self.limiter.max_backoff, self.limiter.base_backoff * 2 ** attempt)
+                self.logger.warning(f"{type(e).__name__}: {e}, retrying in {delay:.1f} seconds")
+            finally:
+                self.limiter.release(completion_tokens)
+            # 在释放并发名额之后再等待，不占着 semaphore
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def codegen(self, message: str, num_samples: int = 1) -> List[Dict]:
+        async def compress_memory(memory: str, encoding):
+            summary_config = {
+                "model": self.name,
+                "messages": [
+                    {"role": "user", "content": f"Please give a summary of below info, notice the question to be solved and the before reply: {memory}"},
+                ],
+                "temperature": 0,
+                "max_tokens": 12000
+            }
+            try:
+                summary_response = await self._create(summary_config, num_tokens_from_string(memory, encoding))
+                return summary_response.choices[0].message.content
+            except APIError as e:
+                self.logger.error(f"OpenAI API error during memory compression: {e}")
+                return memory # 压缩失败时返回原始记忆
+
+        encoding = self.get_tokenizer(self.name)
+        max_message_tokens = self.max_tokens - 50
+        temp_max_prompt_tokens = 8000
+        message_slices = slice_message(message, temp_max_prompt_tokens, encoding)
+        self.logger.info(f"Message has been sliced into {len(message_slices)} part(s).")
+
+        all_responses = [{"response": "", "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}} for _ in
+                         range(num_samples)]
+        memory = ""
+
+        for i, slice_msg in enumerate(message_slices):
+            if num_tokens_from_string(memory, encoding) + num_tokens_from_string(slice_msg, encoding) > max_message_tokens:
+                self.logger.warning("Token limit exceeded, compressing memory...")
+                memory = await compress_memory(memory, encoding)
+
+            current_message = memory + slice_msg if memory else slice_msg
+            config = {
+                "model": self.name,
+                "messages": [{"role": "user", "content": current_message}],
+                "temperature": self.temperature,
+                "max_tokens": self.max_tokens,
+                "n": num_samples,
+            }
+
+            try:
+                response = await self._create(config, num_tokens_from_string(current_message, encoding))
+                for choice in response.choices:
+                    all_responses[choice.index]["response"] += choice.message.content or ""
+                if response.usage:
+                    for resp_item in all_responses:
+                        resp_item["usage"]["prompt_tokens"] += response.usage.prompt_tokens
+                        resp_item["usage"]["completion_tokens"] += response.usage.completion_tokens
+                        resp_item["usage"]["total_tokens"] += response.usage.total_tokens
+                if i < len(message_slices) - 1 and response.choices:
+                    memory += slice_msg + (response.choices[0].message.content or "")
+            except APIError as e:
+                self.logger.error(f"OpenAI API error after all retries: {e}")
+                self.logger.error(f"Request config that failed: {config}")
+                return []
+
+        return all_responses
+
+
 
 # from abc import ABC, abstractmethod
 # from typing import List, Dict
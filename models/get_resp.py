@@ -1,8 +1,23 @@
 # get_resp.py
 from models.model_factory import ModelFactory
+from models.response_cache import ResponseCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_MB
 import logging
 import os
 import json
+import atexit
+import asyncio
+import threading
+import weakref
+
+CONFIG_FILE = os.path.join('models', 'config', 'config.json')
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+# 每个事件循环一个异步模型（客户端和限流器都绑定在循环上），循环内所有请求共享
+_async_models = weakref.WeakKeyDictionary()
+# get_response_limited 的请求都在这个后台事件循环上执行，整个进程共用一个限流器
+_limited_loop = None
+_limited_loop_lock = threading.Lock()
 
 # 都通过兼容 OpenAI 的 API 提供服务。
 def get_response(prompts: list, encoding=None) -> str:
@@ -16,16 +31,21 @@ def get_response(prompts: list, encoding=None) -> str:
     Returns:
         str: 模型的回复内容。
     """
-    # 1. **简化了模型获取和调用流程**
-    # 创建模型工厂，并获取一个配置好的模型实例
-    model = get_model("default")
-    
     # check prompts list is not empty
     if not prompts:
         logging.error("Prompts list cannot be empty.")
         return "Error: Prompts list is empty."
         
     prompt_text = prompts[0]
+    config = load_config()
+    cache_key, reply = lookup_response_cache(config, prompt_text)
+    if reply is not None:
+        return reply
+
+    # 1. **简化了模型获取和调用流程**
+    # 创建模型工厂，并获取一个配置好的模型实例
+    model = get_model("default", config)
+
     print("====================== DEBUG: PROMPT TO LLM ======================")
     logging.info(f"Sending prompt to model '{prompt_text}'...")
     print("==================================================================")
@@ -36,10 +56,109 @@ def get_response(prompts: list, encoding=None) -> str:
         return f"Error: Failed to get a response from model '{model.name}' after multiple retries."
         
     reply = response_list[0].get("response", "Error: Empty response content.")
+    store_response_cache(config, cache_key, model.name, reply)
     
     return reply
 
-def get_model(logger_name="default_logger"):
+async def get_response_async(prompts: list) -> str:
+    """
+    get_response 的异步版本，同样先查回复缓存；同一事件循环内的调用共享一个 AsyncAPIChatDecoder，
+    并发数和 requests/min、tokens/min 由 config.json 中 openai 的 max_concurrency、
+    requests_per_minute、tokens_per_minute 限制，可以同时发起大量调用。
+    """
+    if not prompts:
+        logging.error("Prompts list cannot be empty.")
+        return "Error: Prompts list is empty."
+
+    prompt_text = prompts[0]
+    config = load_config()
+    cache_key, reply = lookup_response_cache(config, prompt_text)
+    if reply is not None:
+        return reply
+
+    model = get_async_model(config)
+    logging.info(f"Sending prompt to model '{prompt_text}'...")
+    response_list = await model.codegen(prompt_text)
+
+    if not response_list:
+        logging.error(f"Failed to get a response from model '{model.name}'.")
+        return f"Error: Failed to get a response from model '{model.name}' after multiple retries."
+
+    reply = response_list[0].get("response", "Error: Empty response content.")
+    store_response_cache(config, cache_key, model.name, reply)
+    return reply
+
+def get_response_limited(prompts: list) -> str:
+    """
+    get_response for callers on many threads: every call runs get_response_async on one process-wide
+    event loop, so all of them share its AsyncRateLimiter (max_concurrency, requests_per_minute,
+    tokens_per_minute and the 429 backoff of config.json) however many threads are calling
+    """
+    return asyncio.run_coroutine_threadsafe(get_response_async(prompts), _get_limited_loop()).result()
+
+def _get_limited_loop():
+    global _limited_loop
+    with _limited_loop_lock:
+        if _limited_loop is None:
+            _limited_loop = asyncio.new_event_loop()
+            threading.Thread(target=_limited_loop.run_forever, name="llm-requests", daemon=True).start()
+        return _limited_loop
+
+def get_async_model(config=None):
+    loop = asyncio.get_running_loop()
+    model = _async_models.get(loop)
+    if model is None:
+        if config is None:
+            config = load_config()
+        factory = ModelFactory(config=config, logger=logging.getLogger("default"))
+        model = factory.create_async_model("openai")
+        _async_models[loop] = model
+    return model
+
+def load_config(config_file=CONFIG_FILE):
+    with open(config_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def use_response_cache(config):
+    """
+    optional "response_cache" section of config.json: enabled (default true), path, max_mb,
+    include_sampled (default false: only temperature 0 replies are served from the cache)
+    """
+    settings = config.get("response_cache", {})
+    if not settings.get("enabled", True):
+        return False
+    return config["openai"]["temperature"] == 0 or settings.get("include_sampled", False)
+
+def lookup_response_cache(config, prompt_text):
+    """
+    (cache key, cached reply) of prompt_text for get_response / get_response_async;
+    the key is None when the cache is not used, the reply None on a miss
+    """
+    if not use_response_cache(config):
+        return None, None
+    api_config = config["openai"]
+    cache_key = ResponseCache.make_key(api_config["default_model"], api_config["temperature"],
+                                       api_config["max_tokens"], prompt_text)
+    return cache_key, get_response_cache(config).get(cache_key)
+
+def store_response_cache(config, cache_key, model_name, reply):
+    # an empty reply (content None) or an error message is not an answer, the next call asks again
+    if cache_key is None or not reply.strip() or reply.startswith("Error:"):
+        return
+    get_response_cache(config).put(cache_key, model_name, reply)
+
+def get_response_cache(config):
+    # one cache per process, shared by the threads calling get_response
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            settings = config.get("response_cache", {})
+            _response_cache = ResponseCache(settings.get("path", DEFAULT_CACHE_PATH),
+                                            int(settings.get("max_mb", DEFAULT_MAX_MB) * 1024 * 1024))
+            atexit.register(_response_cache.close)
+        return _response_cache
+
+def get_model(logger_name="default_logger", config=None):
     # 使用更健壮的日志记录设置
     logging.basicConfig(
         level=logging.INFO,
@@ -48,11 +167,11 @@ def get_model(logger_name="default_logger"):
     logger = logging.getLogger(logger_name)
     
     # 使用 os.path.join 保证跨平台兼容性
-    config_file = os.path.join('models', 'config', 'config.json')
+    config_file = CONFIG_FILE
     
     try:
-        with open(config_file, "r", encoding="utf-8") as f:
-            config = json.load(f)
+        if config is None:
+            config = load_config(config_file)
     except FileNotFoundError:
         logger.error(f"Configuration file not found at: {config_file}")
         raise
@@ -1,7 +1,8 @@
 # model_factory.py
 import logging
-from openai import OpenAI
-from models.decoder import APIChatDecoder  # 我们将把 OpenAIChatDecoder 重命名为更通用的名字
+from openai import OpenAI, AsyncOpenAI
+from models.decoder import APIChatDecoder, AsyncAPIChatDecoder  # 我们将把 OpenAIChatDecoder 重命名为更通用的名字
+from models.rate_limiter import AsyncRateLimiter
 
 class ModelFactory:
     def __init__(self, config: dict, logger=None):
@@ -34,6 +35,41 @@ class ModelFactory:
             # 这个逻辑保持不变，如果未来支持其他后端（如本地的 Transformers），可以在这里扩展。
             raise ValueError(f"Unsupported backend: {backend}")
 
+    def create_async_model(self, backend: str) -> AsyncAPIChatDecoder:
+        """
+        异步版本，需在事件循环内调用；限流参数来自配置：
+        max_concurrency（默认 16）、requests_per_minute / tokens_per_minute（默认 0 不限制）
+        """
+        if backend != "openai":
+            raise ValueError(f"Unsupported backend: {backend}")
+        api_config = self.config["openai"]
+        try:
+            # 429 由 AsyncRateLimiter 统一退避重试，客户端不再自行重试
+            client = AsyncOpenAI(
+                api_key=api_config["api_key"],
+                base_url=api_config["base_url"],
+                max_retries=0,
+                timeout=40.0
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to create AsyncOpenAI client: {e}")
+            raise ValueError(f"Invalid OpenAI configuration: {e}")
+
+        limiter = AsyncRateLimiter(
+            max_concurrency=api_config.get("max_concurrency", 16),
+            requests_per_minute=api_config.get("requests_per_minute", 0),
+            tokens_per_minute=api_config.get("tokens_per_minute", 0),
+        )
+        return AsyncAPIChatDecoder(
+            client=client,
+            name=api_config["default_model"],
+            logger=self.logger,
+            temperature=api_config["temperature"],
+            max_tokens=api_config["max_tokens"],
+            limiter=limiter,
+            max_retries=api_config.get("max_retries", 3),
+        )
+
 
 
 # import logging
@@ -351,4 +351,76 @@ def get_merge_nodes_by_llm_v6(parent_info, child_info):
     {parent_info}
     {child_info}
     Return XML result only
-    """
\ No newline at end of file
+    """
+
+def get_merge_siblings_by_llm(first_info, second_info):
+  yield f"""
+ You are a precise path combining tool. Both inputs are methods (or groups of methods) called by the same parent method, the first one is called before the second one. Combine their log paths into one path set that the parent merge can use as a single callee, outputting only the XML result.
+
+**Input:**
+- First callee info: method name(s), paths (each with log_seq, conditions), source code if available
+- Second callee info: same form, called after the first callee
+
+**Combining Rules:**
+1. Keep every path that carries logs; discard log-less paths.
+2. Tag every exec_flow node and log entry with the fully-qualified method name it comes from.
+3. Do not join the two callees into one sequence: the parent decides which of them run. List the first callee's paths before the second callee's paths.
+4. Keep the conditions of each path exactly as given; merge identical log sequences of the same callee with "or" conditions.
+5. No Log Modification: Use only existing logs from the inputs; never create or alter logs.
+
+**Output (Strict XML Format Only):**
+<merge_result>
+  <valid_paths>
+    <path>
+      <id>[Callee-prefixed path ID, e.g., C1-P2]</id>
+      <eval>[true/false]</eval>
+      <exec_flow>[Execution flow with critical nodes, conditions, and logs]</exec_flow>
+      <log_sequence>[Ordered log entries]</log_sequence>
+    </path>
+  </valid_paths>
+</merge_result>
+
+Combine the following inputs and output only the XML:
+{first_info}
+{second_info}
+
+   """
+
+
+def get_merge_nodes_by_llm_multi(parent_info, children_info):
+  children = "\n".join(f"[Child {i}] {child_info}" for i, child_info in enumerate(children_info, 1))
+  yield f"""
+ You are a precise path merging tool. Your task is to merge the paths of a parent node with the paths of several of its child nodes at once, based on log information and control flow, outputting only the merged XML result.
+
+**Input:**
+- Parent node info: Call point context, paths to enhance (each with log_seq, conditions)
+- Child node info, numbered in the order the parent calls them: Called method source code, mergeable paths (each with log_seq, conditions, eval)
+
+**Merging Rules:**
+1. Call Points: Locate the call statement of every child in the parent code and merge that child's paths at that position only; a child whose call point is on a branch contributes only to the parent paths through that branch.
+2. Log Priority: Parent logs are always retained. Child logs are merged only if they exist and don't conflict; children without logs are skipped.
+3. Path Validity: Only process paths with valid logs; discard log-less paths.
+4. Conflict Handling: Mark paths as invalid if there are definite conditional conflicts (e.g., "x>0" vs "x<0") or data flow conflicts.
+5. Log Sequence: Keep different log sequences as separate paths; merge identical sequences with "or" conditions.
+6. No Log Modification: Use only existing logs from source code; never create or alter logs.
+
+**Output (Strict XML Format Only):**
+<merge_result>
+  <valid_paths>
+    <path>
+      <id>[Path ID, e.g., P1-C1-C3]</id>
+      <eval>[true/false]</eval>
+      <exec_flow>[Merged execution flow with critical nodes, conditions, and logs]</exec_flow>
+      <log_sequence>[Ordered log entries from merged paths]</log_sequence>
+    </path>
+  </valid_paths>
+  <pruned_paths>
+    <path id="[Pruned path ID]" reason="[Conflict explanation]"/>
+  </pruned_paths>
+</merge_result>
+
+Merge the following inputs and output only the XML:
+[Parent] {parent_info}
+{children}
+
+   """
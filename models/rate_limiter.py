@@ -0,0 +1,88 @@
+# rate_limiter.py
+import time
+import asyncio
+import logging
+
+
+class TokenBucket:
+    """
+    令牌桶：每分钟补充 rate_per_minute 个令牌，最多存 rate_per_minute 个。
+    acquire 等到令牌足够再扣除；consume 直接扣除（可以为负），用于按实际用量补扣。
+    rate_per_minute <= 0 表示不限制。
+    """
+
+    def __init__(self, rate_per_minute):
+        self.rate_per_minute = rate_per_minute
+        self.tokens = float(rate_per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate_per_minute, self.tokens + (now - self.updated) * self.rate_per_minute / 60)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        if self.rate_per_minute <= 0:
+            return
+        # 单个请求超过桶容量时按容量计，否则永远等不到
+        amount = min(amount, self.rate_per_minute)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) * 60 / self.rate_per_minute)
+
+    def consume(self, amount):
+        if self.rate_per_minute <= 0:
+            return
+        self._refill()
+        self.tokens -= amount
+
+
+class AsyncRateLimiter:
+    """
+    同一事件循环内所有异步请求共用：
+        - semaphore 限制同时在途的请求数 (max_concurrency)
+        - requests / tokens 两个令牌桶对应服务商的 requests/min 与 tokens/min 配额
+        - 收到 429 时所有请求一起暂停，暂停时间指数增长，成功后恢复
+    """
+
+    def __init__(self, max_concurrency=16, requests_per_minute=0, tokens_per_minute=0,
+                 base_backoff=1.0, max_backoff=60.0):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.backoff = 0.0
+        self.paused_until = 0.0
+        self.rate_limited = 0
+
+    async def acquire(self, prompt_tokens):
+        await self.semaphore.acquire()
+        try:
+            while True:
+                delay = self.paused_until - time.monotonic()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            await self.requests.acquire(1)
+            await self.tokens.acquire(prompt_tokens)
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    def release(self, completion_tokens=0):
+        self.tokens.consume(completion_tokens)
+        self.semaphore.release()
+
+    def on_success(self):
+        self.backoff = 0.0
+
+    def on_rate_limited(self, retry_after=None):
+        self.rate_limited += 1
+        self.backoff = min(self.max_backoff, self.backoff * 2 if self.backoff else self.base_backoff)
+        delay = max(self.backoff, retry_after or 0)
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        logging.warning(f"Rate limited, pausing requests for {delay:.1f} seconds")
@@ -0,0 +1,80 @@
+# response_cache.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+DEFAULT_CACHE_PATH = os.path.join('output', 'llm_response_cache.db')
+DEFAULT_MAX_MB = 512
+
+
+class ResponseCache:
+    """
+    磁盘上的 LLM 回复缓存 (SQLite)，key 为 (model, temperature, max_tokens, prompt) 的 sha256。
+    总大小超过 max_bytes 时按最近访问时间淘汰，直到降到 max_bytes 的 90%。
+    hits / misses 统计本进程的命中情况。
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        cache_dir = os.path.dirname(path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.cnx = sqlite3.connect(path, check_same_thread=False)
+        self.cnx.execute("PRAGMA journal_mode=WAL")
+        self.cnx.execute("""CREATE TABLE IF NOT EXISTS response (
+            key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, last_access REAL)""")
+        self.cnx.execute("CREATE INDEX IF NOT EXISTS idx_response_last_access ON response (last_access)")
+
+    @staticmethod
+    def make_key(model, temperature, max_tokens, prompt):
+        payload = json.dumps([model, temperature, max_tokens, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self.cnx.execute("SELECT response FROM response WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.cnx.execute("UPDATE response SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.cnx.commit()
+            return row[0]
+
+    def put(self, key, model, response):
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self.cnx.execute("INSERT OR REPLACE INTO response VALUES (?, ?, ?, ?, ?)",
+                             (key, model, response, size, time.time()))
+            self._evict()
+            self.cnx.commit()
+
+    def _evict(self):
+        total = self.cnx.execute("SELECT COALESCE(SUM(size), 0) FROM response").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for key, size in self.cnx.execute("SELECT key, size FROM response ORDER BY last_access").fetchall():
+            if total <= target:
+                break
+            self.cnx.execute("DELETE FROM response WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logging.info(f"LLM response cache: evicted {evicted} responses, {total} bytes left")
+
+    def close(self):
+        with self._lock:
+            if self.cnx is None:
+                return
+            logging.info(f"LLM response cache: {self.hits} hits, {self.misses} misses")
+            self.cnx.close()
+            self.cnx = None
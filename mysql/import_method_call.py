@@ -1,23 +1,10 @@
-import mysql.connector
-import configparser
 import re
 import argparse
 import os
-
-def load_db_config(config_file='mysql/config.ini'):
-    config = configparser.ConfigParser()
-    if not os.path.exists(config_file):
-        raise FileNotFoundError(f"Config file {config_file} not found.")
-    config.read(config_file)
-    db_conf = {
-        'host': config.get('mysql', 'host'),
-        'port': config.getint('mysql', 'port'),
-        'user': config.get('mysql', 'user'),
-        'password': config.get('mysql', 'password'),
-        'database': config.get('mysql', 'database'),
-        'charset': 'utf8mb4'
-    }
-    return db_conf
+import sys
+# db_access lives in main/, next to the other pipeline stages
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "main"))
+from db_access import open_store
 
 def get_int(value):
     try:
@@ -30,10 +17,8 @@ def process_callee(callee_field):
     return re.sub(r'^\([^)]+\)', '', callee_field)
 
 def process_method_call_file(input_file="auth-javacg2_merged.jar-output_javacg2/method_call.txt"):
-    db_config = load_db_config()
     try:
-        cnx = mysql.connector.connect(**db_config)
-        cursor = cnx.cursor()
+        db = open_store()
 
         insert_sql = (
             "INSERT INTO method_call "
@@ -65,15 +50,14 @@ def process_method_call_file(input_file="auth-javacg2_merged.jar-output_javacg2/
                     cols[5]            
                 )
                 try:
-                    cursor.execute(insert_sql, values)
-                except mysql.connector.Error as err:
+                    db.execute(insert_sql, values)
+                except db.Error as err:
                     print("insert error", err, "line", line)
 
-        cnx.commit()
-        cursor.close()
-        cnx.close()
+        db.commit()
+        db.close()
         print("success!")
-    except mysql.connector.Error as err:
+    except Exception as err:
         print("error connecting ", err)
 
 def main():
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import mysql.connector
 import configparser
 import logging
 import threading
@@ -10,7 +9,10 @@ import json
 import os
 import time
 import argparse
-from mysql.import_method_call import load_db_config
+import sys
+# db_access lives in main/, next to the other pipeline stages
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "main"))
+from db_access import open_store, MAX_IN_PARAMS
 
 logging.basicConfig(filename="prune_and_update.log",
                     level=logging.INFO,
@@ -22,43 +24,25 @@ CHECKPOINT_INTERVAL = 1000  #address 1000 nodes and save a checkpoint
 
 def ensure_log_propagation_column():
     """ make sure log_propagation,if it's not exists,add it  """
-    db_config = load_db_config()
-    cnx = mysql.connector.connect(**db_config)
-    cursor = cnx.cursor()
-    
-    cursor.execute("SHOW COLUMNS FROM method_call LIKE 'log_propagation'")
-    result = cursor.fetchone()
-    
-    if not result:
-        logging.info("log_propagation not exists adding now ...")
-        cursor.execute("ALTER TABLE method_call ADD COLUMN log_propagation TINYINT DEFAULT 0")
-        cnx.commit()
-        logging.info("log_propagation finish adding !")
-    
-    cursor.close()
-    cnx.close()
+    db = open_store()
+    db.ensure_log_propagation_column()
+    db.close()
 
 """ load call graph and build caller->callee and  callee->caller and node set """
 def load_call_graph():
-    db_config = load_db_config()
-    cnx = mysql.connector.connect(**db_config)
-    cursor = cnx.cursor(dictionary=True)
-    cursor.execute("SELECT caller, callee FROM method_call WHERE enabled = 1")
+    db = open_store()
     
     forward_graph = {}
     reverse_graph = {}
     nodes = set()
     
-    for row in cursor:
-        caller = row["caller"]
-        callee = row["callee"]
+    for caller, callee in db.fetch_edges(log_propagation_only=False):
         nodes.add(caller)
         nodes.add(callee)
         forward_graph.setdefault(caller, set()).add(callee)
         reverse_graph.setdefault(callee, set()).add(caller)
     
-    cursor.close()
-    cnx.close()
+    db.close()
     return forward_graph, reverse_graph, nodes
 
 
@@ -77,10 +61,9 @@ def is_logging_method(method):
 
 edge_queue = queue.Queue()
 
-def db_update_worker(db_config, edge_queue, stop_event, batch_size=1000):
+def db_update_worker(config_file, edge_queue, stop_event, batch_size=1000):
     """ refresh edges by  batch """
-    cnx = mysql.connector.connect(**db_config)
-    cursor = cnx.cursor()
+    db = open_store(config_file)
     batch = []
     while not stop_event.is_set() or not edge_queue.empty():
         try:
@@ -91,21 +74,20 @@ def db_update_worker(db_config, edge_queue, stop_event, batch_size=1000):
             pass
         if len(batch) >= batch_size:
             for caller, callee in batch:
-                cursor.execute(
+                db.execute(
                     "UPDATE method_call SET log_propagation = 1 WHERE caller = %s AND callee = %s",
                     (caller, callee)
                 )
-            cnx.commit()
+            db.commit()
             batch = []
     if batch:
         for caller, callee in batch:
-            cursor.execute(
+            db.execute(
                 "UPDATE method_call SET log_propagation = 1 WHERE caller = %s AND callee = %s",
                 (caller, callee)
             )
-        cnx.commit()
-    cursor.close()
-    cnx.close()
+        db.commit()
+    db.close()
     logging.info("DB finish")
 
 def checkpoint_progress(marked, bfs_queue):
@@ -154,7 +136,7 @@ def bfs_worker(bfs_queue, marked, marked_lock, reverse_graph, edge_queue, checkp
                 checkpoint_progress(marked, bfs_queue)
         bfs_queue.task_done()
 
-def multi_threaded_bfs_update(forward_graph, reverse_graph, nodes, db_config, start_nodes, num_workers=8):
+def multi_threaded_bfs_update(forward_graph, reverse_graph, nodes, config_file, start_nodes, num_workers=8):
     marked_lock = threading.Lock()
     counter_lock = threading.Lock()
     checkpoint_counter = [0] 
@@ -167,7 +149,7 @@ def multi_threaded_bfs_update(forward_graph, reverse_graph, nodes, db_config, st
             bfs_queue.put(node)
     
     stop_event = threading.Event()
-    db_thread = threading.Thread(target=db_update_worker, args=(db_config, edge_queue, stop_event))
+    db_thread = threading.Thread(target=db_update_worker, args=(config_file, edge_queue, stop_event))
     db_thread.start()
     
     workers = []
@@ -190,29 +172,23 @@ def multi_threaded_bfs_update(forward_graph, reverse_graph, nodes, db_config, st
     return marked
 
 def update_method_call_table(marked):
-    db_config = load_db_config()
-    cnx = mysql.connector.connect(**db_config)
-    cursor = cnx.cursor()
-    
     if not marked:
         logging.info("no marked node ,skip")
-        cursor.close()
-        cnx.close()
         return
+    db = open_store()
     
+    # edges between two marked nodes, the callers are looked up MAX_IN_PARAMS at a time
+    # and the callees filtered here, a single IN list per side would exceed the placeholder limit
     marked_list = list(marked)
-    placeholders = ','.join(['%s'] * len(marked_list))
-    query = f"""
-        UPDATE method_call
-        SET log_propagation = 1
-        WHERE caller IN ({placeholders})
-          AND callee IN ({placeholders})
-    """
-    params = marked_list + marked_list
-    cursor.execute(query, params)
-    cnx.commit()
-    cursor.close()
-    cnx.close()
+    for i in range(0, len(marked_list), MAX_IN_PARAMS):
+        chunk = marked_list[i:i + MAX_IN_PARAMS]
+        placeholders = ','.join(['%s'] * len(chunk))
+        rows = db.query(f"SELECT DISTINCT caller, callee FROM method_call WHERE caller IN ({placeholders})", chunk)
+        edges = [(caller, callee) for caller, callee in rows if callee in marked]
+        if edges:
+            db.executemany("UPDATE method_call SET log_propagation = 1 WHERE caller = %s AND callee = %s", edges)
+        db.commit()
+    db.close()
     logging.info("method_call already refreshed log_propagation")
 
 def save_start_nodes(marked, reverse_graph,output_file="output/start_node.txt"):
@@ -235,14 +211,14 @@ def main():
     start_output_file = args.output_file
 
     ensure_log_propagation_column()
-    db_config = load_db_config()
+    config_file = 'mysql/config.ini'
     forward_graph, reverse_graph, nodes = load_call_graph()
     logging.info(f"load callgraph,all the node is {len(nodes)}")
     
     start_nodes = [node for node in nodes if is_logging_method(node)]
     logging.info(f"start log node is  {len(start_nodes)}")
     
-    marked_nodes = multi_threaded_bfs_update(forward_graph, reverse_graph, nodes, db_config, start_nodes)
+    marked_nodes = multi_threaded_bfs_update(forward_graph, reverse_graph, nodes, config_file, start_nodes)
     logging.info(f"multiprocess BFS is finished,marking node is {len(marked_nodes)}")
     
     update_method_call_table(marked_nodes)